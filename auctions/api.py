@@ -0,0 +1,141 @@
+"""
+Read-only JSON API, version 1.
+
+Responses are built from .values() projections rather than model instances
+and carry an ETag derived from Listing.version, which every bid, close and
+edit bumps. A matching If-None-Match is answered with 304 before any body
+is serialized.
+"""
+import hashlib
+from urllib.parse import urlencode
+
+from django.core.files.storage import default_storage
+from django.http import Http404, JsonResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.views.decorators.http import condition, require_GET
+
+from .categories import category_directory
+from .images import CARD_WIDTH, variant_name
+from .models import Bid, Listing
+from .pagination import get_page_size, paginate_request
+
+MAX_PAGE_SIZE = 100
+RECENT_BIDS = 10
+
+LISTING_FIELDS = (
+    "id",
+    "title",
+    "status",
+    "starting_bid",
+    "current_price",
+    "bid_count",
+    "date_posted",
+    "image",
+    "image_variants",
+    "version",
+    "category__name",
+    "author__username",
+)
+STATUSES = {"active": Listing.Status.ACTIVE, "closed": Listing.Status.CLOSED}
+
+
+def make_etag(*parts) -> str:
+    return '"%s"' % hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest()
+
+
+def serialize_listing(row: dict) -> dict:
+    return {
+        "id": row["id"],
+        "title": row["title"],
+        "status": Listing.Status(row["status"]).label.lower(),
+        "price": row["current_price"] if row["current_price"] is not None else float(row["starting_bid"]),
+        "bid_count": row["bid_count"],
+        "category": row["category__name"],
+        "seller": row["author__username"],
+        "posted": row["date_posted"].isoformat(),
+        "image": image_url(row),
+        "url": reverse("listing_detail", args=[row["id"]]),
+    }
+
+
+def image_url(row: dict) -> str | None:
+    if not row["image"]:
+        return None
+    if not row["image_variants"]:
+        return default_storage.url(row["image"])
+    return default_storage.url(variant_name(row["image"], CARD_WIDTH))
+
+
+@require_GET
+def listings(request):
+    """GET /api/v1/listings/?status=&category=&author=&after=&before=&limit="""
+    status = request.GET.get("status", "active")
+    if status not in STATUSES:
+        return JsonResponse({"error": f"status must be one of {', '.join(STATUSES)}."}, status=400)
+    queryset = Listing.objects.filter(status=STATUSES[status])
+    if category := request.GET.get("category"):
+        queryset = queryset.filter(category__name=category)
+    if author := request.GET.get("author"):
+        queryset = queryset.filter(author__username=author)
+    try:
+        page_size = min(int(request.GET.get("limit", get_page_size())), MAX_PAGE_SIZE)
+    except ValueError:
+        return JsonResponse({"error": "limit must be an integer."}, status=400)
+
+    page = paginate_request(request, queryset.values(*LISTING_FIELDS), page_size=max(page_size, 1))
+
+    etag = make_etag(
+        request.GET.urlencode(), [(row["id"], row["version"]) for row in page], page.next_cursor
+    )
+    if (response := get_conditional_response(request, etag=etag)) is not None:
+        return response
+    response = JsonResponse({
+        "results": [serialize_listing(row) for row in page],
+        "next": page.next_cursor,
+        "previous": page.previous_cursor,
+    })
+    response["ETag"] = etag
+    return response
+
+
+def listing_etag(request, id):
+    version = Listing.objects.filter(pk=id).values_list("version", flat=True).first()
+    return None if version is None else make_etag("listing", id, version)
+
+
+@require_GET
+@condition(etag_func=listing_etag)
+def listing_detail(request, id):
+    """GET /api/v1/listings/<id>/ with the most recent bids."""
+    row = Listing.objects.filter(pk=id).values(*LISTING_FIELDS, "description").first()
+    if row is None:
+        raise Http404("No such listing.")
+    # Prices only: the site shows who is bidding to the seller alone, and the
+    # API is open to anonymous clients.
+    prices = Bid.objects.filter(listing_id=id).order_by("-price").values_list("price", flat=True)[:RECENT_BIDS]
+    return JsonResponse({
+        **serialize_listing(row),
+        "description": row["description"],
+        "recent_bids": [{"price": price} for price in prices],
+    })
+
+
+def categories_etag(request):
+    return make_etag("categories", list(category_directory().values()))
+
+
+@require_GET
+@condition(etag_func=categories_etag)
+def categories(request):
+    """GET /api/v1/categories/ with the number of active listings in each."""
+    return JsonResponse({
+        "results": [
+            {
+                "name": entry.name,
+                "active_listings": entry.active_listings,
+                "url": f"{reverse('api_listings')}?{urlencode({'category': entry.name})}",
+            }
+            for entry in category_directory().values()
+        ],
+    })
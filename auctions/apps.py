@@ -1,5 +1,20 @@
 from django.apps import AppConfig
+from django.db.models.signals import m2m_changed, post_delete, post_migrate, pre_delete
+
+
+def install_search_triggers(sender, using, **kwargs):
+    from .search import install_triggers
+
+    install_triggers(using)
 
 
 class AuctionsConfig(AppConfig):
     name = "auctions"
+
+    def ready(self):
+        from .models import Listing, User, recount_deleted_watchlist, recount_watchers, remember_watchlist
+
+        post_migrate.connect(install_search_triggers, sender=self)
+        m2m_changed.connect(recount_watchers, sender=Listing.watchers.through)
+        pre_delete.connect(remember_watchlist, sender=User)
+        post_delete.connect(recount_deleted_watchlist, sender=User)
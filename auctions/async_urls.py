@@ -0,0 +1,11 @@
+"""Async overrides of auctions.urls, routed to by commerce.asgi."""
+from django.urls import path
+
+from . import async_views
+
+urlpatterns = [
+    path("", async_views.index, name="index"),
+    path("category/<str:category>/", async_views.category, name="category"),
+    path("listing/<int:id>/", async_views.listing_detail, name="listing_detail"),
+    path("listing/<int:id>/events/", async_views.listing_events, name="listing_events"),
+]
@@ -0,0 +1,112 @@
+"""
+Async versions of the read-heavy views, built on the async ORM API.
+
+commerce.asgi routes index, category and listing_detail here, along with
+the listing_events stream that only works under ASGI (see
+auctions.async_urls), so under ASGI these requests wait on the database
+without holding a worker thread. Templates are rendered on the event loop,
+so everything they touch (request.user, the session behind messages) is
+resolved asynchronously first.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.http import Http404, StreamingHttpResponse
+from django.shortcuts import render
+
+from . import events, views
+from .cache import card_cache_timeout
+from .categories import aget_category
+from .forms import NewBidForm, NewCommentForm
+from .models import Listing
+from .pagination import apaginate_request
+
+
+async def resolve_user(request):
+    """
+    Load request.user (and with it the session) without blocking the loop.
+
+    The lazy request.user would otherwise run a synchronous query the first
+    time a template or context processor touches it.
+    """
+    request.user = await request.auser()
+    return request.user
+
+
+async def render_listing_grid(request, listings, title):
+    """Async version of views.render_listing_grid()."""
+    user = await resolve_user(request)
+    page = await apaginate_request(request, listings.for_cards(user))
+    return render(request, "auctions/index.html", {
+        "listings": page,
+        "page": page,
+        "title": title,
+        "card_cache_timeout": card_cache_timeout(),
+        })
+
+
+async def index(request):
+    return await render_listing_grid(
+        request, Listing.objects.filter(status=Listing.Status.ACTIVE), "Active Listings"
+    )
+
+
+async def category(request, category):
+    entry = await aget_category(category)
+    if entry is None:
+        raise Http404("No such category.")
+    return await render_listing_grid(
+        request,
+        Listing.objects.filter(status=Listing.Status.ACTIVE, category_id=entry.id),
+        entry.name,
+    )
+
+
+@login_required
+async def listing_detail(request, id):
+    if request.method != "GET":
+        # Bids and comments are writes, they keep going through the sync view.
+        return await sync_to_async(views.listing_detail)(request, id)
+
+    user = await resolve_user(request)
+    try:
+        listing = await Listing.objects.for_detail(user).aget(pk=id)
+    except Listing.DoesNotExist:
+        raise Http404("No Listing matches the given query.")
+    comments = await apaginate_request(request, views.comments_for(id), page_size=settings.COMMENTS_PAGE_SIZE)
+
+    return render(
+        request,
+        "auctions/detail.html",
+        {
+            "bid_form": NewBidForm(user=user, listing=listing),
+            "comment_form": NewCommentForm(),
+            "listing": listing,
+            "comments": comments,
+            # Only this ASGI-served page can subscribe to listing_events.
+            "live_events": True,
+        },
+    )
+
+
+@login_required
+async def listing_events(request, id):
+    """Server-Sent Events stream of bids and the close of a listing, see auctions.events."""
+    if not await Listing.objects.filter(pk=id).aexists():
+        raise Http404("No such listing.")
+
+    async def snapshot():
+        listing = await Listing.objects.only(
+            "status", "starting_bid", "current_price", "bid_count"
+        ).aget(pk=id)
+        return {
+            "price": listing.price,
+            "bid_count": listing.bid_count,
+            "status": "closed" if listing.status == Listing.Status.CLOSED else "active",
+        }
+
+    return StreamingHttpResponse(
+        events.stream(id, snapshot),
+        content_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.db import transaction
+
+# Fragment name used by the {% cache %} block around each card in index.html
+CARD_FRAGMENT = "listing_card"
+DEFAULT_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Cache key of auctions.categories.category_directory()
+CATEGORY_DIRECTORY_KEY = "category_directory"
+
+
+def card_cache_timeout() -> int:
+    return getattr(settings, "LISTING_CARD_CACHE_TIMEOUT", DEFAULT_CARD_CACHE_TIMEOUT)
+
+
+def card_fragment_key(listing) -> str:
+    return make_template_fragment_key(CARD_FRAGMENT, [listing.pk, listing.version])
+
+
+def forget_listing_card(listing) -> None:
+    """
+    Drop the cached card of listing right away.
+
+    Not needed for correctness, bumping Listing.version already makes the old
+    fragment unreachable, but frees the entry of a listing that is going away.
+    """
+    cache.delete(card_fragment_key(listing))
+
+
+def forget_category_directory() -> None:
+    """
+    Drop the cached category directory once the current transaction commits,
+    so it cannot be rebuilt from data that is about to change.
+    """
+    transaction.on_commit(lambda: cache.delete(CATEGORY_DIRECTORY_KEY))
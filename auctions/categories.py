@@ -0,0 +1,69 @@
+"""
+Cached directory of categories with their active-listing counts.
+
+The directory is built by one grouped query and kept in the default cache,
+so the categories page and the name lookups behind /category/<name>/ cost
+no queries while it is warm. forget_category_directory() drops it whenever
+a category changes or a listing is created, closed, deleted or moved to
+another category; CATEGORY_DIRECTORY_TIMEOUT bounds how stale it can get
+in caches that are not shared between processes.
+"""
+from dataclasses import dataclass
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from .cache import CATEGORY_DIRECTORY_KEY
+from .models import Category, Listing
+
+DEFAULT_CATEGORY_DIRECTORY_TIMEOUT = 300
+
+
+@dataclass(frozen=True)
+class CategoryEntry:
+    id: int
+    name: str
+    active_listings: int
+
+
+def _timeout() -> int:
+    return getattr(settings, "CATEGORY_DIRECTORY_TIMEOUT", DEFAULT_CATEGORY_DIRECTORY_TIMEOUT)
+
+
+def _load() -> dict[str, CategoryEntry]:
+    rows = (
+        Category.objects.annotate(
+            active_listings=Count("listing", filter=Q(listing__status=Listing.Status.ACTIVE))
+        )
+        .order_by("name")
+        .values_list("id", "name", "active_listings")
+    )
+    return {name: CategoryEntry(pk, name, count) for pk, name, count in rows}
+
+
+def category_directory() -> dict[str, CategoryEntry]:
+    """Every category by name, in name order."""
+    directory = cache.get(CATEGORY_DIRECTORY_KEY)
+    if directory is None:
+        directory = _load()
+        cache.set(CATEGORY_DIRECTORY_KEY, directory, _timeout())
+    return directory
+
+
+async def acategory_directory() -> dict[str, CategoryEntry]:
+    """Async version of category_directory()."""
+    directory = await cache.aget(CATEGORY_DIRECTORY_KEY)
+    if directory is None:
+        directory = await sync_to_async(_load)()
+        await cache.aset(CATEGORY_DIRECTORY_KEY, directory, _timeout())
+    return directory
+
+
+def get_category(name: str) -> CategoryEntry | None:
+    return category_directory().get(name)
+
+
+async def aget_category(name: str) -> CategoryEntry | None:
+    return (await acategory_directory()).get(name)
@@ -0,0 +1,214 @@
+"""
+Live listing events (new bids, closes) for the Server-Sent Events stream.
+
+publish() is called from the synchronous bid and close code paths once their
+transaction commits. Subscribers are asyncio queues owned by the SSE
+responses in auctions.views, so an idle connection costs a queue and a
+suspended coroutine rather than a thread.
+
+Two backends, chosen with AUCTION_EVENTS_BACKEND:
+
+- "local": events are handed straight to the subscribers of this process.
+- "database": events are appended to the ListingEvent table, and one
+  polling task per process fans new rows out to its subscribers. This lets
+  several worker processes share events without an external broker.
+"""
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ListingEvent
+
+logger = logging.getLogger(__name__)
+
+QUEUE_SIZE = 32
+HEARTBEAT_INTERVAL = 15  # seconds
+POLL_INTERVAL = 0.5  # seconds
+RETENTION = timedelta(minutes=10)
+PRUNE_EVERY = 120  # polls
+
+
+def get_backend() -> str:
+    return getattr(settings, "AUCTION_EVENTS_BACKEND", "local")
+
+
+def format_sse(event: dict) -> str:
+    """Encode event as a Server-Sent Events message named after its type."""
+    return f"event: {event['type']}\ndata: {json.dumps(event, separators=(',', ':'))}\n\n"
+
+
+async def stream(listing_id: int, snapshot):
+    """
+    Yield SSE messages for listing_id: its current state, then every event.
+
+    snapshot is an async callable returning the listing's state. It runs
+    after subscribing so no event can slip in between. A comment line is sent
+    when nothing happened for HEARTBEAT_INTERVAL seconds, keeping proxies from
+    timing out idle connections, and the stream ends once the listing closes.
+    """
+    heartbeat = getattr(settings, "AUCTION_EVENTS_HEARTBEAT", HEARTBEAT_INTERVAL)
+    subscription = broker.subscribe(listing_id)
+    try:
+        await broker.started()
+        state = await snapshot()
+        yield format_sse({"type": "state", **state})
+        if state["status"] == "closed":
+            return
+        while True:
+            event = await subscription.get(timeout=heartbeat)
+            if event is None:
+                yield ": heartbeat\n\n"
+                continue
+            yield format_sse(event)
+            if event["type"] == "closed":
+                return
+    finally:
+        subscription.close()
+
+
+class Subscription:
+    def __init__(self, broker: "EventBroker", listing_id: int):
+        self.broker = broker
+        self.listing_id = listing_id
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.dropped = 0
+
+    def offer(self, event: dict) -> None:
+        """
+        Queue event without ever blocking the publisher.
+
+        A subscriber that falls QUEUE_SIZE events behind loses its oldest
+        ones. Every bid event carries the price and bid count as of that bid,
+        so the newest is all a slow client needs.
+        """
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout: float) -> dict | None:
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except TimeoutError:
+            return None
+
+    def close(self) -> None:
+        self.broker.unsubscribe(self)
+
+
+class EventBroker:
+    def __init__(self):
+        self.subscriptions: dict[int, set[Subscription]] = defaultdict(set)
+        self.poller: asyncio.Task | None = None
+        self.poller_started: asyncio.Future | None = None
+
+    def subscribe(self, listing_id: int) -> Subscription:
+        subscription = Subscription(self, listing_id)
+        self.subscriptions[listing_id].add(subscription)
+        if get_backend() == "database" and (self.poller is None or self.poller.done()):
+            self.poller_started = subscription.loop.create_future()
+            self.poller = subscription.loop.create_task(self.poll(self.poller_started))
+        return subscription
+
+    async def started(self) -> None:
+        """
+        Wait until the poller knows the event it starts after. A snapshot
+        taken earlier could miss the events published in between.
+        """
+        if self.poller_started is not None:
+            await asyncio.shield(self.poller_started)
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscribers = self.subscriptions.get(subscription.listing_id)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self.subscriptions[subscription.listing_id]
+
+    def dispatch(self, listing_id: int, event: dict) -> None:
+        """Hand event to this process's subscribers, from any thread."""
+        for subscription in list(self.subscriptions.get(listing_id, ())):
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, event)
+            except RuntimeError:
+                # The subscriber's event loop is gone, so is the client.
+                self.unsubscribe(subscription)
+
+    async def poll(self, started: asyncio.Future) -> None:
+        """Fan out new ListingEvent rows until the last subscriber leaves."""
+        try:
+            last_id = await sync_to_async(_latest_event_id)()
+        except Exception as exc:
+            started.set_exception(exc)
+            raise
+        started.set_result(None)
+        polls = 0
+        while self.subscriptions:
+            await asyncio.sleep(POLL_INTERVAL)
+            try:
+                last_id, events = await sync_to_async(_events_after)(last_id, set(self.subscriptions))
+                polls += 1
+                if polls % PRUNE_EVERY == 0:
+                    await sync_to_async(_prune_events)()
+            except Exception:
+                logger.exception("Polling listing events failed")
+                continue
+            for listing_id, event in events:
+                self.dispatch(listing_id, event)
+
+
+broker = EventBroker()
+
+
+def _latest_event_id() -> int:
+    return ListingEvent.objects.order_by("-pk").values_list("pk", flat=True).first() or 0
+
+
+def _events_after(last_id: int, listing_ids: set[int]) -> tuple[int, list[tuple[int, dict]]]:
+    """Return the newest event id and the events after last_id for listing_ids."""
+    events = []
+    rows = ListingEvent.objects.filter(pk__gt=last_id).order_by("pk")
+    for last_id, listing_id, kind, data in rows.values_list("pk", "listing_id", "kind", "data"):
+        if listing_id in listing_ids:
+            events.append((listing_id, {"type": kind, **data}))
+    return last_id, events
+
+
+def _prune_events() -> None:
+    ListingEvent.objects.filter(created__lt=timezone.now() - RETENTION).delete()
+
+
+def publish_many(kind: str, events: list[tuple[int, dict]]) -> None:
+    """publish() a batch of (listing_id, data) events of one kind at once."""
+    if get_backend() == "database":
+        ListingEvent.objects.bulk_create(
+            [ListingEvent(listing_id=listing_id, kind=kind, data=data) for listing_id, data in events],
+            batch_size=500,
+        )
+    else:
+        def dispatch():
+            for listing_id, data in events:
+                broker.dispatch(listing_id, {"type": kind, **data})
+        transaction.on_commit(dispatch)
+
+
+def publish(listing_id: int, kind: str, **data) -> None:
+    """
+    Publish an event about listing_id as part of the current transaction.
+
+    With the database backend the event row commits or rolls back together
+    with the change it describes; local subscribers are only notified once
+    the transaction has committed.
+    """
+    if get_backend() == "database":
+        ListingEvent.objects.create(listing_id=listing_id, kind=kind, data=data)
+    else:
+        transaction.on_commit(lambda: broker.dispatch(listing_id, {"type": kind, **data}))
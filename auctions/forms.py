@@ -1,5 +1,7 @@
 from django import forms
+from django.utils import timezone
 from .models import Listing, Bid, Comment
+from .uploads import ListingImageField
 
 from crispy_forms.helper import FormHelper
 from crispy_forms.layout import Layout, Field, Submit, Div
@@ -8,16 +10,25 @@ from crispy_forms.layout import Layout, Field, Submit, Div
 class NewListingForm(forms.ModelForm):
     class Meta:
         model = Listing
-        fields = ["title", "description", "image", "starting_bid", "category"]
+        fields = ["title", "description", "image", "starting_bid", "category", "ends_at"]
+        # Checked and re-encoded on upload, see auctions.uploads.
+        field_classes = {"image": ListingImageField}
 
         widgets = {
             "description": forms.Textarea(
                 attrs={
                     "rows": 10,
                 }
-            )
+            ),
+            "ends_at": forms.DateTimeInput(attrs={"type": "datetime-local"}),
         }
 
+    def clean_ends_at(self):
+        ends_at = self.cleaned_data["ends_at"]
+        if ends_at is not None and ends_at <= timezone.now():
+            raise forms.ValidationError("The end of the auction must be in the future.")
+        return ends_at
+
 
 class NewBidForm(forms.ModelForm):
     class Meta:
@@ -40,19 +51,22 @@ class NewBidForm(forms.ModelForm):
         self.helper.include_media = False
 
     def clean_price(self) -> float | forms.ValidationError:
-        """Validate that price is higher than starting_bid and highest bid."""
+        """
+        Validate that price is higher than starting_bid and highest bid.
+
+        This only checks the listing snapshot for early feedback, the final
+        decision is made race-free by services.place_bid().
+        """
         price = self.cleaned_data["price"]
 
         if not self.listing:
             raise forms.ValidationError("Listing is required for validation.")
 
         # Must also be higher than highest existing bid (if any)
-        highest_bid = (
-            Bid.objects.filter(listing=self.listing).order_by("-price").first()
-        )
-        if highest_bid and price <= highest_bid.price:
+        highest_bid = self.listing.current_price
+        if highest_bid is not None and price <= highest_bid:
             raise forms.ValidationError(
-                f"Your bid must be higher than the current highest bid (${highest_bid.price})."
+                f"Your bid must be higher than the current highest bid (${highest_bid})."
             )
         
         # Must be higher than starting bid
@@ -61,7 +75,7 @@ class NewBidForm(forms.ModelForm):
                 f"Your bid must be higher than the starting bid (${self.listing.starting_bid})."
             )
         
-        if highest_bid and highest_bid.bidder == self.user:
+        if highest_bid is not None and self.listing.is_highest_bidder(self.user):
             raise forms.ValidationError("Your bid is already the highest bid!")
 
         return price
@@ -0,0 +1,144 @@
+import logging
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+CARD_WIDTH = 260
+DETAIL_WIDTH = 800
+VARIANT_WIDTHS = (CARD_WIDTH, DETAIL_WIDTH)
+
+JPEG_QUALITY = 82
+WEBP_QUALITY = 80
+
+# Uploaded originals, see normalise_upload()
+UPLOAD_FORMATS = {"JPEG": ".jpg", "PNG": ".png", "WEBP": ".webp"}
+UPLOAD_JPEG_QUALITY = 90
+UPLOAD_WEBP_QUALITY = 90
+DEFAULT_UPLOAD_MAX_DIMENSION = 2048
+DEFAULT_UPLOAD_MAX_PIXELS = 40_000_000
+
+
+def variant_name(name: str, width: int, ext: str | None = None) -> str:
+    """Storage name of the width-px variant of name, e.g. gba.png -> gba_260w.png."""
+    root, original_ext = os.path.splitext(name)
+    return f"{root}_{width}w{ext or original_ext}"
+
+
+def variant_names(name: str) -> list[str]:
+    return [variant_name(name, width, ext) for width in VARIANT_WIDTHS for ext in (None, ".webp")]
+
+
+def variants_exist(storage, name: str) -> bool:
+    return all(storage.exists(target) for target in variant_names(name))
+
+
+def save_variant(storage, name: str, content) -> str:
+    """Save a file derived from an original under exactly name."""
+    save_exact = getattr(storage, "save_exact", None)
+    if save_exact is not None:
+        return save_exact(name, content)
+    return storage.save(name, content)
+
+
+def delete_image(storage, name: str) -> None:
+    """Delete an original image and all of its variants from storage."""
+    for target in (name, *variant_names(name)):
+        storage.delete(target)
+
+
+def _encode(image: Image.Image, fmt: str, jpeg_quality: int = JPEG_QUALITY, webp_quality: int = WEBP_QUALITY) -> bytes:
+    # No exif or other metadata is passed on to the encoded file.
+    buffer = BytesIO()
+    if fmt == "WEBP":
+        image.save(buffer, "WEBP", quality=webp_quality, method=4)
+    elif fmt == "JPEG":
+        image.convert("RGB").save(buffer, "JPEG", quality=jpeg_quality, optimize=True, progressive=True)
+    else:
+        image.save(buffer, fmt, optimize=True)
+    return buffer.getvalue()
+
+
+def generate_variants(field_file, overwrite: bool = False) -> list[str]:
+    """
+    Write the card and detail sized variants of an ImageField file, in the
+    original format and as WebP, next to the original in the same storage.
+
+    Returns the names written. Images smaller than a variant width are
+    re-encoded at their own size, never upscaled.
+    """
+    if not field_file:
+        return []
+    storage = field_file.storage
+    name = field_file.name
+    targets = [
+        (width, ext)
+        for width in VARIANT_WIDTHS
+        for ext in (None, ".webp")
+        if overwrite or not storage.exists(variant_name(name, width, ext))
+    ]
+    if not targets:
+        return []
+
+    try:
+        with storage.open(name, "rb") as f:
+            original = Image.open(f)
+            fmt = original.format or "PNG"
+            original = ImageOps.exif_transpose(original)
+            original.load()
+    except (OSError, UnidentifiedImageError):
+        logger.warning("Could not generate image variants for %s", name, exc_info=True)
+        return []
+
+    written = []
+    for width, ext in targets:
+        image = original.copy()
+        image.thumbnail((width, width), Image.Resampling.LANCZOS)
+        target = variant_name(name, width, ext)
+        if storage.exists(target):
+            storage.delete(target)
+        save_variant(storage, target, ContentFile(_encode(image, "WEBP" if ext else fmt)))
+        written.append(target)
+    return written
+
+
+def normalise_upload(upload) -> ContentFile:
+    """
+    Re-encode an uploaded image without its metadata (EXIF, GPS position,
+    comments), turned upright and shrunk to fit LISTING_IMAGE_MAX_DIMENSION.
+
+    The pixel count is checked from the header before anything is decoded,
+    so decompression bombs are refused at no cost. JPEGs are decoded at the
+    smallest DCT scale still covering the target size, which keeps memory
+    near that of the capped image even for very large photos; other formats
+    are bounded by LISTING_IMAGE_MAX_PIXELS.
+    """
+    max_dimension = getattr(settings, "LISTING_IMAGE_MAX_DIMENSION", DEFAULT_UPLOAD_MAX_DIMENSION)
+    max_pixels = getattr(settings, "LISTING_IMAGE_MAX_PIXELS", DEFAULT_UPLOAD_MAX_PIXELS)
+    upload.seek(0)
+    try:
+        with Image.open(upload) as image:
+            fmt = image.format
+            if fmt not in UPLOAD_FORMATS:
+                raise ValidationError("Upload a JPEG, PNG or WebP image.", code="invalid_image_format")
+            width, height = image.size
+            if width * height > max_pixels:
+                raise ValidationError(
+                    f"The image is {width}x{height} pixels, at most {max_pixels // 1_000_000} megapixels are accepted.",
+                    code="too_many_pixels",
+                )
+            scale = max(width, height) / max_dimension
+            if fmt == "JPEG" and scale > 1:
+                image.draft("RGB", (int(width / scale), int(height / scale)))
+            ImageOps.exif_transpose(image, in_place=True)
+            image.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+            data = _encode(image, fmt, UPLOAD_JPEG_QUALITY, UPLOAD_WEBP_QUALITY)
+    except (OSError, Image.DecompressionBombError, UnidentifiedImageError):
+        raise ValidationError("Upload a valid image.", code="invalid_image")
+    root = os.path.splitext(os.path.basename(upload.name or "image"))[0]
+    return ContentFile(data, name=root + UPLOAD_FORMATS[fmt])
@@ -0,0 +1,153 @@
+import asyncio
+import io
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from auctions.models import Category, Listing, User
+from commerce.asgi import CommerceASGIHandler
+
+from .benchmark_views import percentile
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the throughput of the sync views under WSGI (a thread pool) with the async "
+        "views under ASGI (concurrent tasks on one event loop), in-process against a seeded "
+        "throwaway database. No network or server is involved, only the Django handlers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--listings", type=int, default=1000)
+        parser.add_argument("--requests", type=int, default=500, help="Requests per view and handler.")
+        parser.add_argument("--threads", type=int, default=16, help="WSGI worker threads.")
+        parser.add_argument("--concurrency", type=int, default=200, help="Concurrent ASGI requests.")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Write the JSON report to this file instead of stdout.")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=False)
+        try:
+            call_command(
+                "seed_marketplace",
+                listings=options["listings"],
+                users=max(10, options["listings"] // 10),
+                seed=options["seed"],
+                stdout=io.StringIO(),
+            )
+            cache.clear()
+            report = self.run_benchmarks(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                f.write(output + "\n")
+        else:
+            self.stdout.write(output)
+
+    def run_benchmarks(self, options):
+        client = Client()
+        client.force_login(User.objects.order_by("pk").first())
+        cookie = f"{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}"
+        listing = Listing.objects.filter(status=Listing.Status.ACTIVE).order_by("-bid_count").first()
+        paths = ["/", f"/category/{Category.objects.order_by('pk').first().name}/", f"/listing/{listing.pk}/"]
+        # Background connections opened by the seeding must not leak into worker threads.
+        connection.close()
+
+        report = {
+            "listings": options["listings"],
+            "requests": options["requests"],
+            "wsgi_threads": options["threads"],
+            "asgi_concurrency": options["concurrency"],
+            "views": {},
+        }
+        for path in paths:
+            report["views"][path] = {
+                "wsgi": self.run_wsgi(path, cookie, options),
+                "asgi": asyncio.run(self.run_asgi(path, cookie, options)),
+            }
+        return report
+
+    def summarize(self, timings, statuses, elapsed):
+        return {
+            "requests_per_second": round(len(timings) / elapsed, 1),
+            "p50_ms": round(percentile(timings, 50) * 1000, 3),
+            "p95_ms": round(percentile(timings, 95) * 1000, 3),
+            "statuses": sorted(set(statuses)),
+        }
+
+    def run_wsgi(self, path, cookie, options):
+        handler = WSGIHandler()
+
+        def request(_):
+            environ = {"PATH_INFO": path, "HTTP_COOKIE": cookie, "SERVER_NAME": "testserver"}
+            setup_testing_defaults(environ)
+            status = []
+            started = time.perf_counter()
+            response = handler(environ, lambda s, headers, exc_info=None: status.append(s))
+            b"".join(response)
+            response.close()
+            return time.perf_counter() - started, int(status[0].split()[0])
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["threads"]) as pool:
+            results = list(pool.map(request, range(options["requests"])))
+        elapsed = time.perf_counter() - started
+        return self.summarize([t for t, _ in results], [s for _, s in results], elapsed)
+
+    async def run_asgi(self, path, cookie, options):
+        handler = CommerceASGIHandler()
+        limit = asyncio.Semaphore(options["concurrency"])
+
+        async def request():
+            scope = {
+                "type": "http",
+                "asgi": {"version": "3.0"},
+                "http_version": "1.1",
+                "method": "GET",
+                "scheme": "http",
+                "path": path,
+                "raw_path": path.encode(),
+                "query_string": b"",
+                "headers": [(b"host", b"testserver"), (b"cookie", cookie.encode())],
+                "server": ("testserver", 80),
+                "client": ("127.0.0.1", 0),
+            }
+            received = False
+            status = []
+
+            async def receive():
+                nonlocal received
+                if not received:
+                    received = True
+                    return {"type": "http.request", "body": b"", "more_body": False}
+                # Never disconnect, the handler cancels this wait when it is done.
+                await asyncio.Future()
+
+            async def send(message):
+                if message["type"] == "http.response.start":
+                    status.append(message["status"])
+
+            async with limit:
+                started = time.perf_counter()
+                await handler(scope, receive, send)
+                return time.perf_counter() - started, status[0]
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(request() for _ in range(options["requests"])))
+        elapsed = time.perf_counter() - started
+        return self.summarize([t for t, _ in results], [s for _, s in results], elapsed)
@@ -0,0 +1,178 @@
+import io
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import time
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, close_old_connections, connection, connections
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from auctions.models import Listing, User
+from auctions.services import BidStatus, place_bid
+
+from .benchmark_views import percentile
+
+# Database settings each profile applies on top of the plain sqlite3 configuration.
+PROFILES = {
+    "default": {"CONN_MAX_AGE": 0, "CONN_HEALTH_CHECKS": False, "OPTIONS": {}},
+    "production": settings.SQLITE_PRODUCTION_PROFILE,
+}
+
+
+def use_database(name, profile):
+    """Point the default alias of this process at name, configured with profile."""
+    connections.close_all()
+    connection.settings_dict.update(NAME=name, **profile)
+
+
+def reader(path, profile, paths, cookie, start, deadline, results):
+    use_database(path, profile)
+    handler = WSGIHandler()
+    timings, errors = [], 0
+    start.wait()
+    while time.time() < deadline.value:
+        environ = {"PATH_INFO": random.choice(paths), "HTTP_COOKIE": cookie, "SERVER_NAME": "testserver"}
+        setup_testing_defaults(environ)
+        status = []
+        started = time.perf_counter()
+        response = handler(environ, lambda s, headers, exc_info=None: status.append(s))
+        b"".join(response)
+        response.close()
+        timings.append(time.perf_counter() - started)
+        errors += not status[0].startswith("200")
+    results.put({"role": "read", "timings": timings, "errors": errors})
+
+
+def writer(path, profile, user_id, listing_ids, start, deadline, results):
+    use_database(path, profile)
+    user = User.objects.get(pk=user_id)
+    timings, errors = [], 0
+    start.wait()
+    while time.time() < deadline.value:
+        started = time.perf_counter()
+        # The request_started/request_finished bookkeeping of a real request,
+        # which is where CONN_MAX_AGE decides whether to reconnect.
+        close_old_connections()
+        try:
+            listing = Listing.objects.get(pk=random.choice(listing_ids))
+            result = place_bid(listing, user, listing.price + random.randint(1, 5))
+            errors += result.status is BidStatus.BUSY
+        except OperationalError:
+            errors += 1
+        close_old_connections()
+        timings.append(time.perf_counter() - started)
+    results.put({"role": "write", "timings": timings, "errors": errors})
+
+
+class Command(BaseCommand):
+    help = (
+        "Run concurrent reader and bidder processes against copies of a seeded throwaway SQLite "
+        "database, once with the default settings and once with SQLITE_PRODUCTION_PROFILE, and "
+        "report throughput, latency and lock errors of each as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--listings", type=int, default=1000)
+        parser.add_argument("--readers", type=int, default=4, help="Processes rendering GET views.")
+        parser.add_argument("--writers", type=int, default=4, help="Processes placing bids.")
+        parser.add_argument("--duration", type=float, default=10, help="Seconds per profile.")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Write the JSON report to this file instead of stdout.")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        use_database(connection.settings_dict["NAME"], PROFILES["default"])
+        tmp = tempfile.mkdtemp()
+        # The worker processes copy the seeded database, so it has to be a file
+        # rather than the in-memory database the test runner would create.
+        connection.settings_dict["TEST"]["NAME"] = os.path.join(tmp, "seeded.sqlite3")
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=False)
+        try:
+            call_command(
+                "seed_marketplace",
+                listings=options["listings"],
+                users=max(10, options["listings"] // 10),
+                seed=options["seed"],
+                stdout=io.StringIO(),
+            )
+            cache.clear()
+            report = self.run_benchmarks(tmp, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            shutil.rmtree(tmp)
+
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                f.write(output + "\n")
+        else:
+            self.stdout.write(output)
+
+    def run_benchmarks(self, tmp, options):
+        client = Client()
+        client.force_login(User.objects.order_by("pk").first())
+        cookie = f"{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}"
+        listing_ids = list(
+            Listing.objects.filter(status=Listing.Status.ACTIVE).order_by("-bid_count").values_list("pk", flat=True)[:20]
+        )
+        paths = ["/", *(f"/listing/{pk}/" for pk in listing_ids[:5])]
+        bidders = [
+            User.objects.create_user(f"bench-bidder-{i}", password="x").pk for i in range(options["writers"])
+        ]
+        seeded = connection.settings_dict["NAME"]
+        connections.close_all()
+
+        report = {
+            "listings": options["listings"],
+            "readers": options["readers"],
+            "writers": options["writers"],
+            "duration": options["duration"],
+            "profiles": {},
+        }
+        context = multiprocessing.get_context("fork")
+        for name, profile in PROFILES.items():
+            path = os.path.join(tmp, f"{name}.sqlite3")
+            shutil.copyfile(seeded, path)
+            start, results = context.Event(), context.Queue()
+            deadline = context.Value("d", 0.0)
+            processes = [
+                context.Process(target=reader, args=(path, profile, paths, cookie, start, deadline, results))
+                for _ in range(options["readers"])
+            ] + [
+                context.Process(target=writer, args=(path, profile, user_id, listing_ids, start, deadline, results))
+                for user_id in bidders
+            ]
+            for process in processes:
+                process.start()
+            deadline.value = time.time() + options["duration"]
+            start.set()
+            outcomes = [results.get() for _ in processes]
+            for process in processes:
+                process.join()
+            report["profiles"][name] = {
+                role: self.summarize([o for o in outcomes if o["role"] == role], options["duration"])
+                for role in ("read", "write")
+            }
+        return report
+
+    def summarize(self, outcomes, duration):
+        timings = [t for outcome in outcomes for t in outcome["timings"]]
+        if not timings:
+            return {"per_second": 0, "errors": sum(o["errors"] for o in outcomes)}
+        return {
+            "per_second": round(len(timings) / duration, 1),
+            "p50_ms": round(percentile(timings, 50) * 1000, 3),
+            "p95_ms": round(percentile(timings, 95) * 1000, 3),
+            "errors": sum(o["errors"] for o in outcomes),
+        }
@@ -0,0 +1,130 @@
+import io
+import json
+import statistics
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import URLPattern
+
+from auctions import urls
+from auctions.models import Category, Listing, User
+
+# POST-only or session-ending views, a GET would either fail or log us out,
+# and the never-ending event stream.
+SKIPPED_VIEWS = {"logout", "delete_listing", "close_listing", "listing_events", "toggle_watchlist"}
+
+INSTRUMENTATION_MIDDLEWARE = "commerce.middleware.PerformanceMiddleware"
+
+
+def percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway test database at each data size and report p50/p95 latency, "
+        "SQL query count and response size for every GET view in auctions/urls.py as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes", default="100,1000", help="Comma separated listing counts to benchmark at."
+        )
+        parser.add_argument("--requests", type=int, default=20, help="Timed requests per view.")
+        parser.add_argument("--warmup", type=int, default=2, help="Untimed requests per view.")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Write the JSON report to this file instead of stdout.")
+        parser.add_argument(
+            "--instrument",
+            action="store_true",
+            help="Run with commerce.middleware.PerformanceMiddleware enabled, to measure its overhead.",
+        )
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options["sizes"].split(",")]
+        report = {"requests": options["requests"], "instrumented": options["instrument"], "sizes": {}}
+        middleware = [m for m in settings.MIDDLEWARE if m != INSTRUMENTATION_MIDDLEWARE]
+        if options["instrument"]:
+            middleware.insert(0, INSTRUMENTATION_MIDDLEWARE)
+
+        # What the test client needs of setup_test_environment(), without its
+        # template instrumentation, and callable from inside the test runner.
+        test_settings = override_settings(
+            MIDDLEWARE=middleware, DEBUG=False, ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]
+        )
+        with test_settings:
+            for size in sizes:
+                report["sizes"][size] = self.benchmark_size(size, options)
+
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                f.write(output + "\n")
+        else:
+            self.stdout.write(output)
+
+    def benchmark_size(self, size, options):
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=False)
+        try:
+            call_command(
+                "seed_marketplace",
+                listings=size,
+                users=max(10, size // 10),
+                seed=options["seed"],
+                stdout=io.StringIO(),
+            )
+            # Cached cards are keyed on (id, version), which repeat across the seeded databases.
+            cache.clear()
+            user = User.objects.order_by("pk").first()
+            client = Client()
+            client.force_login(user)
+            return {
+                name: self.benchmark_url(client, url, options)
+                for name, url in self.urls(user)
+            }
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def urls(self, user):
+        """Yield (name, url) for every view in auctions/urls.py with its arguments filled in."""
+        listing = Listing.objects.filter(status=Listing.Status.ACTIVE).order_by("-bid_count").first()
+        category = Category.objects.order_by("pk").first()
+        values = {"id": listing.pk, "category": category.name}
+        for pattern in urls.urlpatterns:
+            if not isinstance(pattern, URLPattern) or pattern.name in SKIPPED_VIEWS:
+                continue
+            route = str(pattern.pattern)
+            for converter, value in values.items():
+                route = route.replace(f"<int:{converter}>", str(value)).replace(f"<str:{converter}>", str(value))
+            query = "?q=vintage" if pattern.name.startswith("search") else ""
+            yield pattern.name, f"/{route}{query}"
+
+    def benchmark_url(self, client, url, options):
+        for _ in range(options["warmup"]):
+            client.get(url)
+        timings, query_counts, sizes = [], [], []
+        status = None
+        for _ in range(options["requests"]):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = client.get(url)
+                timings.append((time.perf_counter() - started) * 1000)
+            status = response.status_code
+            query_counts.append(len(queries))
+            sizes.append(len(response.content))
+        return {
+            "url": url,
+            "status": status,
+            "p50_ms": round(percentile(timings, 50), 3),
+            "p95_ms": round(percentile(timings, 95), 3),
+            "queries": statistics.median_low(query_counts),
+            "bytes": statistics.median_low(sizes),
+        }
@@ -0,0 +1,50 @@
+from django.core.files.storage import storages
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F
+
+from auctions.images import save_variant, variant_names
+from auctions.models import Listing, release_image
+from auctions.storage import ContentAddressedStorage, is_addressed
+
+
+class Command(BaseCommand):
+    help = (
+        "Move existing listing images, with their variants, into content-addressed storage, "
+        "storing identical files once."
+    )
+
+    def handle(self, *args, **options):
+        storage = storages["default"]
+        if not isinstance(storage, ContentAddressedStorage):
+            raise CommandError("The default storage is not auctions.storage.ContentAddressedStorage.")
+
+        names = (
+            Listing.objects.exclude(image="").exclude(image__isnull=True)
+            .order_by("image").values_list("image", flat=True).distinct()
+        )
+        stored_names, moved, missing = set(), 0, 0
+        for name in list(names):
+            if is_addressed(name):
+                continue
+            if not storage.exists(name):
+                missing += 1
+                continue
+            with storage.open(name, "rb") as f:
+                stored = storage.save(name, f)
+            for variant, target in zip(variant_names(name), variant_names(stored)):
+                if storage.exists(variant) and not storage.exists(target):
+                    with storage.open(variant, "rb") as f:
+                        save_variant(storage, target, f)
+            with transaction.atomic():
+                # Bumping the version drops cached cards that link the old name.
+                Listing.objects.filter(image=name).update(image=stored, version=F("version") + 1)
+            release_image(storage, name)
+            stored_names.add(stored)
+            moved += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Moved {moved} image(s) into {len(stored_names)} content-addressed file(s)."
+        ))
+        if missing:
+            self.stderr.write(f"{missing} referenced image(s) were not found in storage and were left alone.")
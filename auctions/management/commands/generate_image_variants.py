@@ -0,0 +1,36 @@
+from itertools import batched
+
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from auctions.images import generate_variants, variants_exist
+from auctions.models import Listing
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = "Generate the card/detail sized and WebP variants of existing listing images."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--overwrite", action="store_true", help="Regenerate variants that already exist."
+        )
+
+    def handle(self, *args, **options):
+        listings = (
+            Listing.objects.exclude(image="").exclude(image__isnull=True).only("image", "image_variants")
+        )
+        written = 0
+        for batch in batched(listings.iterator(chunk_size=BATCH_SIZE), BATCH_SIZE):
+            changed = {True: [], False: []}
+            for listing in batch:
+                written += len(generate_variants(listing.image, overwrite=options["overwrite"]))
+                ready = variants_exist(listing.image.storage, listing.image.name)
+                if ready != listing.image_variants:
+                    changed[ready].append(listing.pk)
+            # Recorded per batch, with the version bump that drops cached cards.
+            for ready, pks in changed.items():
+                if pks:
+                    Listing.objects.filter(pk__in=pks).update(image_variants=ready, version=F("version") + 1)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} image variant(s)."))
@@ -0,0 +1,152 @@
+import sys
+from decimal import Decimal, InvalidOperation
+from itertools import batched
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from auctions.cache import forget_category_directory
+from auctions.images import variants_exist
+from auctions.models import Bid, Category, Comment, Listing, User
+from auctions.transfer import (
+    FORMATS, copy_image, detect_format, keep_auto_now_add, parse_timestamp, read_records,
+)
+
+
+class Command(BaseCommand):
+    help = "Stream listings with their bids and comments from a JSON lines or CSV file into the database."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help='Input file, or "-" for stdin.')
+        parser.add_argument("--format", choices=FORMATS, help="Defaults to the extension of path.")
+        parser.add_argument(
+            "--batch-size", type=int, default=2000,
+            help="Listings inserted per bulk_create() and transaction.",
+        )
+        parser.add_argument(
+            "--images-from", default=settings.MEDIA_ROOT,
+            help="Directory the image paths in the file are relative to (default: MEDIA_ROOT).",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        try:
+            fmt = detect_format(path, options["format"] or ("jsonl" if path == "-" else None))
+        except ValueError as e:
+            raise CommandError(e)
+
+        self.images_from = options["images_from"]
+        self.missing_images = 0
+        # Name -> id of every user and category, so resolving a reference
+        # never costs a query. New names are added as batches create them.
+        self.user_ids = dict(User.objects.values_list("username", "id").iterator())
+        self.category_ids = dict(Category.objects.values_list("name", "id"))
+        self.unusable_password = make_password(None)
+
+        imported = 0
+        f = sys.stdin if path == "-" else open(path, encoding="utf-8", newline="")
+        try:
+            with keep_auto_now_add(Listing, Comment):
+                for batch in batched(read_records(f, fmt), options["batch_size"]):
+                    try:
+                        self.import_batch(batch)
+                    except (KeyError, TypeError, ValueError, InvalidOperation) as e:
+                        raise CommandError(
+                            f"Invalid record in listings {imported + 1}-{imported + len(batch)}: {e!r}"
+                        )
+                    imported += len(batch)
+                    self.stdout.write(f"  {imported} listings", ending="\r")
+        except ValueError as e:
+            # From read_records(), the file itself is malformed.
+            raise CommandError(f"{e} ({imported} listing(s) imported before it).")
+        finally:
+            if f is not sys.stdin:
+                f.close()
+        self.stdout.write("")
+
+        if self.missing_images:
+            self.stderr.write(f"{self.missing_images} image(s) were not found in {self.images_from}.")
+        self.stdout.write(self.style.SUCCESS(f"Imported {imported} listing(s)."))
+
+    def resolve_users(self, names):
+        missing = {name for name in names if name and name not in self.user_ids}
+        if missing:
+            created = User.objects.bulk_create(
+                [User(username=name, password=self.unusable_password) for name in sorted(missing)]
+            )
+            self.user_ids.update((user.username, user.pk) for user in created)
+
+    def resolve_categories(self, names):
+        missing = {name for name in names if name and name not in self.category_ids}
+        if missing:
+            created = Category.objects.bulk_create([Category(name=name) for name in sorted(missing)])
+            self.category_ids.update((category.name, category.pk) for category in created)
+
+    def image_name(self, name):
+        if not name:
+            return None
+        stored = copy_image(name, self.images_from, default_storage)
+        if stored is None:
+            self.missing_images += 1
+        return stored
+
+    @transaction.atomic
+    def import_batch(self, records):
+        self.resolve_users(
+            name
+            for record in records
+            for name in (
+                record["author"],
+                record.get("winner"),
+                *(bid["bidder"] for bid in record.get("bids") or ()),
+                *(comment["author"] for comment in record.get("comments") or ()),
+            )
+        )
+        self.resolve_categories(record.get("category") for record in records)
+
+        now = timezone.now()
+        listings = []
+        for record in records:
+            bids = sorted(record.get("bids") or (), key=lambda bid: float(bid["price"]))
+            top = bids[-1] if bids else None
+            winner = record.get("winner")
+            image = self.image_name(record.get("image"))
+            listings.append(Listing(
+                title=record["title"],
+                description=record.get("description") or "",
+                author_id=self.user_ids[record["author"]],
+                starting_bid=Decimal(str(record["starting_bid"])),
+                image=image,
+                # copy_image() brings the variants along when the source had them.
+                image_variants=bool(image) and variants_exist(default_storage, image),
+                category_id=self.category_ids.get(record.get("category")),
+                date_posted=parse_timestamp(record.get("date_posted")) or now,
+                status=int(record.get("status") or Listing.Status.ACTIVE),
+                winner_id=self.user_ids[winner] if winner else None,
+                ends_at=parse_timestamp(record.get("ends_at")),
+                # bulk_create() bypasses Bid.save() and Comment.save(), so fill in the summaries here.
+                current_price=float(top["price"]) if top else None,
+                current_bidder_id=self.user_ids[top["bidder"]] if top else None,
+                bid_count=len(bids),
+                comment_count=len(record.get("comments") or ()),
+            ))
+        Listing.objects.bulk_create(listings)
+
+        bids, comments = [], []
+        for listing, record in zip(listings, records):
+            for bid in record.get("bids") or ():
+                bids.append(Bid(listing_id=listing.pk, bidder_id=self.user_ids[bid["bidder"]], price=float(bid["price"])))
+            for comment in record.get("comments") or ():
+                comments.append(Comment(
+                    listing_id=listing.pk,
+                    author_id=self.user_ids[comment["author"]],
+                    content=comment["content"],
+                    date_posted=parse_timestamp(comment.get("date_posted")) or now,
+                ))
+        Bid.objects.bulk_create(bids)
+        Comment.objects.bulk_create(comments)
+        forget_category_directory()
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from auctions.models import Listing
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the denormalized current_price, current_bidder, bid_count, "
+        "watcher_count and comment_count of every listing."
+    )
+
+    def handle(self, *args, **options):
+        updated = Listing.objects.refresh_bid_summaries()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt bid summaries for {updated} listing(s)."))
+        updated = Listing.objects.refresh_watcher_counts()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt watcher counts for {updated} listing(s)."))
+        updated = Listing.objects.refresh_comment_counts()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt comment counts for {updated} listing(s)."))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from auctions.search import install_triggers, rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the FTS5 full-text index of listing titles and descriptions."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--no-optimize", action="store_true", help="Skip merging the index b-trees after rebuilding."
+        )
+
+    def handle(self, *args, **options):
+        if install_triggers():
+            self.stdout.write("Recreated missing search index triggers.")
+        rebuild_index(optimize=not options["no_optimize"])
+        self.stdout.write(self.style.SUCCESS("Rebuilt the listing search index."))
@@ -0,0 +1,38 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from auctions.scheduler import AuctionScheduler, close_expired
+
+
+class Command(BaseCommand):
+    help = "Close listings automatically when their ends_at deadline passes. Runs until interrupted."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--horizon", type=int, default=600, help="Seconds of upcoming deadlines to keep in memory."
+        )
+        parser.add_argument(
+            "--refresh", type=int, default=30, help="Seconds between look-ups of new or changed deadlines."
+        )
+        parser.add_argument(
+            "--once", action="store_true", help="Close the listings that have already expired and exit."
+        )
+
+    def handle(self, *args, **options):
+        if options["once"]:
+            closed = close_expired()
+            self.stdout.write(self.style.SUCCESS(f"Closed {closed} expired listing(s)."))
+            return
+
+        scheduler = AuctionScheduler(
+            horizon=timedelta(seconds=options["horizon"]),
+            refresh=timedelta(seconds=options["refresh"]),
+        )
+        self.stdout.write("Auction scheduler running, press CTRL-C to stop.")
+        try:
+            scheduler.run(
+                on_close=lambda count: self.stdout.write(f"Closed {count} expired listing(s).")
+            )
+        except KeyboardInterrupt:
+            self.stdout.write("Auction scheduler stopped.")
@@ -0,0 +1,117 @@
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from auctions.cache import forget_category_directory
+from auctions.models import Bid, Category, Comment, Listing, User
+
+WORDS = (
+    "vintage rare mint boxed signed retro red blue green black white classic limited "
+    "edition original handmade wooden leather steel gold silver antique modern bicycle "
+    "camera guitar console watch lamp chair table jacket sneakers poster record book "
+    "football puzzle drone keyboard speaker"
+).split()
+
+
+class Command(BaseCommand):
+    help = "Fill the database with deterministic synthetic users, listings, bids, comments and watchers."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100)
+        parser.add_argument("--categories", type=int, default=10)
+        parser.add_argument("--listings", type=int, default=1000)
+        parser.add_argument("--bids", type=int, default=5, help="Maximum bids per listing.")
+        parser.add_argument("--comments", type=int, default=3, help="Maximum comments per listing.")
+        parser.add_argument("--watchers", type=int, default=3, help="Maximum watchers per listing.")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--password", default="password", help="Password of every generated user.")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        batch_size = options["batch_size"]
+
+        # Hashing is the slow part of creating users, do it once for all of them.
+        password = make_password(options["password"])
+        offset = User.objects.count()
+        users = User.objects.bulk_create(
+            [
+                User(username=f"user{offset + i}", email=f"user{offset + i}@example.com", password=password)
+                for i in range(options["users"])
+            ],
+            batch_size=batch_size,
+        )
+        offset = Category.objects.count()
+        categories = Category.objects.bulk_create(
+            [Category(name=f"Category {offset + i}") for i in range(options["categories"])]
+        )
+
+        created = 0
+        while created < options["listings"]:
+            count = min(batch_size, options["listings"] - created)
+            self.create_batch(rng, count, users, categories, options)
+            created += count
+            self.stdout.write(f"  {created}/{options['listings']} listings", ending="\r")
+        self.stdout.write("")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {len(users)} users, {len(categories)} categories and {created} listings."
+        ))
+
+    @transaction.atomic
+    def create_batch(self, rng, count, users, categories, options):
+        listings, bids_by_listing, watchers_by_listing = [], [], []
+        for _ in range(count):
+            author = rng.choice(users)
+            starting_bid = rng.randint(1, 500)
+            bidders = [u for u in rng.sample(users, min(len(users), options["bids"])) if u != author]
+            bids = []
+            price = float(starting_bid)
+            for bidder in bidders[: rng.randint(0, len(bidders))]:
+                price = round(price + rng.uniform(0.5, 25), 2)
+                bids.append(Bid(price=price, bidder=bidder))
+            listing_watchers = rng.sample(users, rng.randint(0, min(len(users), options["watchers"])))
+            comment_count = rng.randint(0, options["comments"])
+            listing = Listing(
+                title=" ".join(rng.choices(WORDS, k=rng.randint(2, 5))).capitalize(),
+                description=" ".join(rng.choices(WORDS, k=rng.randint(20, 120))),
+                author=author,
+                starting_bid=starting_bid,
+                category=rng.choice(categories) if categories and rng.random() > 0.1 else None,
+                status=Listing.Status.CLOSED if rng.random() < 0.2 else Listing.Status.ACTIVE,
+                # bulk_create() bypasses Bid.save(), so fill in the bid summary here.
+                current_price=bids[-1].price if bids else None,
+                current_bidder=bids[-1].bidder if bids else None,
+                bid_count=len(bids),
+                watcher_count=len(listing_watchers),
+                comment_count=comment_count,
+            )
+            if listing.status == Listing.Status.CLOSED:
+                listing.winner = listing.current_bidder
+            listings.append(listing)
+            bids_by_listing.append(bids)
+            watchers_by_listing.append(listing_watchers)
+
+        Listing.objects.bulk_create(listings)
+
+        bids, comments, watchers = [], [], []
+        Watcher = Listing.watchers.through
+        for listing, listing_bids, listing_watchers in zip(listings, bids_by_listing, watchers_by_listing):
+            for bid in listing_bids:
+                bid.listing = listing
+                bids.append(bid)
+            for _ in range(listing.comment_count):
+                comments.append(Comment(
+                    content=" ".join(rng.choices(WORDS, k=rng.randint(5, 30))),
+                    author=rng.choice(users),
+                    listing=listing,
+                ))
+            for user in listing_watchers:
+                watchers.append(Watcher(listing_id=listing.pk, user_id=user.pk))
+
+        Bid.objects.bulk_create(bids)
+        Comment.objects.bulk_create(comments)
+        Watcher.objects.bulk_create(watchers)
+        forget_category_directory()
@@ -0,0 +1,44 @@
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from commerce.replicas import replica_lag, snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the SQLite primary database into every SQLite replica in DATABASE_REPLICAS, "
+        "every --interval seconds until interrupted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval", type=float, help="Seconds between snapshots (default: REPLICA_LAG)."
+        )
+        parser.add_argument("--once", action="store_true", help="Take one snapshot and exit.")
+
+    def handle(self, *args, **options):
+        replicas = getattr(settings, "DATABASE_REPLICAS", [])
+        if not replicas:
+            raise CommandError("No DATABASE_REPLICAS are configured, see DJANGO_SQLITE_REPLICA.")
+        interval = options["interval"] or replica_lag()
+
+        if not options["once"]:
+            self.stdout.write(f"Snapshotting every {interval:g}s, press CTRL-C to stop.")
+        try:
+            while True:
+                started = time.monotonic()
+                for replica in replicas:
+                    try:
+                        snapshot(replica)
+                    except ImproperlyConfigured as e:
+                        raise CommandError(e)
+                elapsed = time.monotonic() - started
+                if options["once"]:
+                    self.stdout.write(self.style.SUCCESS(f"Snapshotted {len(replicas)} replica(s) in {elapsed:.2f}s."))
+                    return
+                time.sleep(max(interval - elapsed, 0))
+        except KeyboardInterrupt:
+            self.stdout.write("Replica snapshots stopped.")
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.5 on 2026-10-18 19:15
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_bid_summary(apps, schema_editor):
+    Listing = apps.get_model('auctions', 'Listing')
+    Bid = apps.get_model('auctions', 'Bid')
+    top_bids = Bid.objects.filter(listing=OuterRef('pk')).order_by('-price', 'id')
+    bid_counts = (
+        Bid.objects.filter(listing=OuterRef('pk'))
+        .order_by()
+        .values('listing')
+        .annotate(total=Count('id'))
+        .values('total')
+    )
+    Listing.objects.update(
+        current_price=Subquery(top_bids.values('price')[:1]),
+        current_bidder=Subquery(top_bids.values('bidder')[:1]),
+        bid_count=Coalesce(Subquery(bid_counts), Value(0)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0014_comment_date_posted'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='bid_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='current_bidder',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='current_price',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_bid_summary, migrations.RunPython.noop),
+    ]
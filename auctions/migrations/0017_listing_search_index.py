@@ -0,0 +1,64 @@
+from django.db import migrations
+
+
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE auctions_listing_fts USING fts5(
+        title,
+        description,
+        content='auctions_listing',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER auctions_listing_fts_insert AFTER INSERT ON auctions_listing BEGIN
+        INSERT INTO auctions_listing_fts(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER auctions_listing_fts_delete AFTER DELETE ON auctions_listing BEGIN
+        INSERT INTO auctions_listing_fts(auctions_listing_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER auctions_listing_fts_update AFTER UPDATE OF title, description ON auctions_listing BEGIN
+        INSERT INTO auctions_listing_fts(auctions_listing_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO auctions_listing_fts(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+    "INSERT INTO auctions_listing_fts(auctions_listing_fts) VALUES ('rebuild')",
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS auctions_listing_fts_insert",
+    "DROP TRIGGER IF EXISTS auctions_listing_fts_delete",
+    "DROP TRIGGER IF EXISTS auctions_listing_fts_update",
+    "DROP TABLE IF EXISTS auctions_listing_fts",
+]
+
+
+def run_on_sqlite(statements):
+    def run(apps, schema_editor):
+        # FTS5 is SQLite specific, other backends simply have no search index.
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for sql in statements:
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0016_listing_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_on_sqlite(CREATE_SQL), run_on_sqlite(DROP_SQL)),
+    ]
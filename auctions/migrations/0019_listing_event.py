@@ -0,0 +1,24 @@
+# Generated by Django 5.2.5 on 2026-10-18 19:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0018_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListingEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=16)),
+                ('data', models.JSONField(default=dict)),
+                ('created', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='auctions.listing')),
+            ],
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.5 on 2026-10-18 19:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0019_listing_event'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='ends_at',
+            field=models.DateTimeField(blank=True, help_text='The auction closes automatically at this time.', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['status', 'ends_at'], name='listing_status_ends_at_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-18 19:34
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_watcher_count(apps, schema_editor):
+    Listing = apps.get_model('auctions', 'Listing')
+    counts = (
+        Listing.watchers.through.objects.filter(listing=OuterRef('pk'))
+        .order_by()
+        .values('listing')
+        .annotate(total=Count('id'))
+        .values('total')
+    )
+    Listing.objects.update(watcher_count=Coalesce(Subquery(counts), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0020_listing_ends_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='watcher_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_watcher_count, migrations.RunPython.noop),
+    ]
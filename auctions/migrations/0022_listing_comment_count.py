@@ -0,0 +1,34 @@
+# Generated by Django 5.2.5 on 2026-10-18 19:40
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_comment_count(apps, schema_editor):
+    Listing = apps.get_model('auctions', 'Listing')
+    Comment = apps.get_model('auctions', 'Comment')
+    counts = (
+        Comment.objects.filter(listing=OuterRef('pk'))
+        .order_by()
+        .values('listing')
+        .annotate(total=Count('id'))
+        .values('total')
+    )
+    Listing.objects.update(comment_count=Coalesce(Subquery(counts), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0021_listing_watcher_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_comment_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-18 20:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0022_listing_comment_count'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['image'], name='listing_image_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 20:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0023_listing_image_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='image_variants',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+    ]
@@ -1,5 +1,19 @@
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, Count, Exists, F, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .cache import forget_category_directory
+from .images import (
+    CARD_WIDTH,
+    DETAIL_WIDTH,
+    delete_image,
+    generate_variants,
+    save_variant,
+    variant_name,
+    variants_exist,
+)
 
 
 class User(AbstractUser):
@@ -11,6 +25,92 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        forget_category_directory()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        forget_category_directory()
+        return result
+
+class ListingQuerySet(models.QuerySet):
+    CARD_FIELDS = (
+        "id",
+        "title",
+        "description",
+        "starting_bid",
+        "image",
+        "image_variants",
+        "date_posted",
+        "status",
+        "ends_at",
+        "current_price",
+        "watcher_count",
+        "version",
+        "author__username",
+        "category__name",
+    )
+
+    def for_cards(self, user=None) -> "ListingQuerySet":
+        """Everything index.html needs for a listing card, in a single query."""
+        return (
+            self.select_related("author", "category")
+            .only(*self.CARD_FIELDS)
+            .annotate(is_watched=self._is_watched(user))
+        )
+
+    @staticmethod
+    def _is_watched(user):
+        if user is not None and user.is_authenticated:
+            return Exists(Listing.watchers.through.objects.filter(listing=OuterRef("pk"), user=user))
+        return Value(False, output_field=models.BooleanField())
+
+    def for_detail(self, user=None) -> "ListingQuerySet":
+        """Everything detail.html needs for the listing itself, in a single query."""
+        return self.select_related("author", "category", "current_bidder", "winner").annotate(
+            is_watched=self._is_watched(user)
+        )
+
+    def refresh_bid_summaries(self) -> int:
+        """Recompute current_price, current_bidder and bid_count from the bids table."""
+        top_bids = Bid.objects.filter(listing=OuterRef("pk")).order_by("-price", "id")
+        bid_counts = (
+            Bid.objects.filter(listing=OuterRef("pk"))
+            .order_by()
+            .values("listing")
+            .annotate(total=Count("id"))
+            .values("total")
+        )
+        return self.update(
+            current_price=Subquery(top_bids.values("price")[:1]),
+            current_bidder=Subquery(top_bids.values("bidder")[:1]),
+            bid_count=Coalesce(Subquery(bid_counts), Value(0)),
+            version=F("version") + 1,
+        )
+
+    def refresh_watcher_counts(self) -> int:
+        """Recompute watcher_count from the watchers through table."""
+        counts = (
+            Listing.watchers.through.objects.filter(listing=OuterRef("pk"))
+            .order_by()
+            .values("listing")
+            .annotate(total=Count("id"))
+            .values("total")
+        )
+        return self.update(watcher_count=Coalesce(Subquery(counts), Value(0)), version=F("version") + 1)
+
+    def refresh_comment_counts(self) -> int:
+        """Recompute comment_count from the comments table."""
+        counts = (
+            Comment.objects.filter(listing=OuterRef("pk"))
+            .order_by()
+            .values("listing")
+            .annotate(total=Count("id"))
+            .values("total")
+        )
+        return self.update(comment_count=Coalesce(Subquery(counts), Value(0)))
+
 class Listing(models.Model):
     class Status(models.IntegerChoices):
         ACTIVE = 0, "Active"
@@ -21,6 +121,9 @@ class Listing(models.Model):
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name="listings_authored")
     starting_bid = models.DecimalField(max_digits=10, decimal_places=2)
     image = models.ImageField(upload_to="listing_images", blank=True, null=True)
+    # Whether every resized variant of image exists, set by generate_image_variants().
+    # Until then pages link the original.
+    image_variants = models.BooleanField(default=False, editable=False)
     category = models.ForeignKey(
         "Category", on_delete=models.SET_NULL, blank=True, null=True
     )
@@ -31,25 +134,201 @@ class Listing(models.Model):
     )
     winner = models.ForeignKey(User, on_delete=models.CASCADE, blank=True, null=True, related_name="listings_won")
     watchers = models.ManyToManyField(User, related_name="watchlist", blank=True)
+    ends_at = models.DateTimeField(
+        blank=True, null=True, help_text="The auction closes automatically at this time."
+    )
+
+    # Denormalized from the bids table, kept in sync by Bid.save()/Bid.delete().
+    # Rebuild with `manage.py rebuild_bid_summaries`, which also rebuilds watcher_count.
+    current_price = models.FloatField(blank=True, null=True, editable=False)
+    current_bidder = models.ForeignKey(
+        User, on_delete=models.SET_NULL, blank=True, null=True, editable=False, related_name="+"
+    )
+    bid_count = models.PositiveIntegerField(default=0, editable=False)
+    # Kept in sync by services.toggle_watch(), and recounted when watchers change
+    # any other way (see recount_watchers()). Rebuilt by the same command.
+    watcher_count = models.PositiveIntegerField(default=0, editable=False)
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+    # Incremented on every change that affects how the listing renders. Cached
+    # fragments are keyed on it, so bumping it is all invalidation takes.
+    version = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = ListingQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Every grid filters on status and pages newest first on (date_posted, id).
+            models.Index(fields=["status", "date_posted"], name="listing_status_date_idx"),
+            models.Index(fields=["status", "category", "date_posted"], name="listing_status_cat_date_idx"),
+            models.Index(fields=["status", "author", "date_posted"], name="listing_status_author_date_idx"),
+            models.Index(fields=["status", "winner", "date_posted"], name="listing_status_winner_date_idx"),
+            # run_auction_scheduler's look-ahead window of upcoming deadlines
+            models.Index(fields=["status", "ends_at"], name="listing_status_ends_at_idx"),
+            # Counting the listings that share a stored image, see release_image().
+            models.Index(fields=["image"], name="listing_image_idx"),
+        ]
 
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._counted_as = instance._directory_key()
+        return instance
+
+    def _directory_key(self):
+        """What the category directory's active counts depend on (None if deferred)."""
+        return self.__dict__.get("category_id"), self.__dict__.get("status")
+
+    def save(self, *args, **kwargs):
+        counts_changed = self._state.adding or self._directory_key() != getattr(self, "_counted_as", None)
+        bump = not self._state.adding
+        if bump:
+            self.version = F("version") + 1
+            if kwargs.get("update_fields") is not None:
+                kwargs["update_fields"] = {*kwargs["update_fields"], "version"}
+        upload = self.image.file if self.image and not self.image._committed else None
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if upload is not None:
+                restore_image(self.image, upload)
+        if bump:
+            self.refresh_from_db(fields=["version"])
+        # Only creating, closing or recategorising changes the active counts.
+        if counts_changed:
+            self._counted_as = self._directory_key()
+            forget_category_directory()
+
+    def delete(self, *args, **kwargs):
+        image = self.image.name
+        result = super().delete(*args, **kwargs)
+        forget_category_directory()
+        if image:
+            storage = self.image.storage
+            transaction.on_commit(lambda: release_image(storage, image))
+        return result
+
+    def _image_variant_url(self, width: int, ext: str | None = None) -> str | None:
+        """The variant's URL once they are all written, until then the original's (no WebP)."""
+        if not self.image:
+            return None
+        if not self.image_variants:
+            return None if ext else self.image.url
+        return self.image.storage.url(variant_name(self.image.name, width, ext))
+
+    @property
+    def card_image_url(self) -> str | None:
+        return self._image_variant_url(CARD_WIDTH)
+
     @property
-    def highest_bid(self) -> int:
-        return self.bids.order_by("-price").first()
+    def card_webp_url(self) -> str | None:
+        return self._image_variant_url(CARD_WIDTH, ".webp")
 
     @property
-    def highest_bidder(self) -> User:
-        return self.bids.order_by("-price").first().bidder
-    
+    def detail_image_url(self) -> str | None:
+        return self._image_variant_url(DETAIL_WIDTH)
+
+    @property
+    def detail_webp_url(self) -> str | None:
+        return self._image_variant_url(DETAIL_WIDTH, ".webp")
+
+    def generate_image_variants(self, overwrite: bool = False) -> list[str]:
+        """
+        Write the resized and WebP variants of the image, see
+        images.generate_variants(), and record whether they all exist.
+        """
+        written = generate_variants(self.image, overwrite=overwrite)
+        ready = bool(self.image) and variants_exist(self.image.storage, self.image.name)
+        if ready != self.image_variants:
+            # A single UPDATE: neither the category counts nor the instance's
+            # other fields change, so save() would only add work.
+            Listing.objects.filter(pk=self.pk).update(image_variants=ready, version=F("version") + 1)
+            self.image_variants = ready
+        return written
+
+    @property
+    def price(self) -> float:
+        """What the item currently costs: the highest bid, else the starting bid."""
+        return self.current_price if self.current_price is not None else float(self.starting_bid)
+
+    @property
+    def has_ended(self) -> bool:
+        return self.ends_at is not None and self.ends_at <= timezone.now()
+
     @property
-    def bid_count(self) -> int:
-        return self.bids.count()
+    def highest_bid(self) -> float | None:
+        return self.current_price
+
+    @property
+    def highest_bidder(self) -> User | None:
+        return self.current_bidder
 
     def is_highest_bidder(self, user) -> bool:
-        return self.highest_bid is not None and self.highest_bid.bidder == user
-    
+        return self.current_bidder_id is not None and self.current_bidder_id == user.pk
+
+
+def release_image(storage, name: str) -> bool:
+    """
+    Delete the stored image name, and its variants, unless a listing still
+    refers to it. Content-addressed storage lets many listings share one
+    file, so the references are counted rather than assumed. Returns
+    whether the file was deleted.
+    """
+    with transaction.atomic():
+        # Counted with a (no-op) UPDATE so the write lock is held from the
+        # count until the files are gone, whatever the transaction mode: no
+        # listing naming the file can commit in between, see restore_image().
+        if Listing.objects.filter(image=name).update(image=name):
+            return False
+        delete_image(storage, name)
+    return True
+
+
+def restore_image(image, content) -> None:
+    """
+    Re-save content, just uploaded as image, if the stored file is gone. An
+    upload whose content was already stored reuses that file, which
+    release_image() may delete before the new listing commits. Called after
+    the listing row is written, under the write lock, so the check cannot
+    race the release.
+    """
+    if image.storage.exists(image.name):
+        return
+    content.seek(0)
+    save_variant(image.storage, image.name, content)
+
+
+def recount_watchers(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    m2m_changed receiver for Listing.watchers: the admin form,
+    listing.watchers.add() and user.watchlist.clear() go through the related
+    managers, which toggle_watch() does not, so recount what they touched.
+    """
+    if action == "pre_clear" and reverse:
+        instance._cleared_watchlist = list(instance.watchlist.values_list("pk", flat=True))
+        return
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        listings = [instance.pk]
+    elif action == "post_clear":
+        listings = instance.__dict__.pop("_cleared_watchlist", [])
+    else:
+        listings = pk_set
+    Listing.objects.filter(pk__in=listings).refresh_watcher_counts()
+
+
+def remember_watchlist(sender, instance, **kwargs):
+    """pre_delete receiver for User: deleting a user cascades to its watchlist rows."""
+    instance._deleted_watchlist = list(instance.watchlist.values_list("pk", flat=True))
+
+
+def recount_deleted_watchlist(sender, instance, **kwargs):
+    """post_delete receiver for User, see remember_watchlist()."""
+    Listing.objects.filter(pk__in=instance.__dict__.pop("_deleted_watchlist", [])).refresh_watcher_counts()
+
+
 class Comment(models.Model):
     content = models.TextField()
     author = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -58,6 +337,27 @@ class Comment(models.Model):
             Listing, on_delete=models.CASCADE, related_name="comments", null=True
         )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["listing", "-date_posted"], name="comment_listing_date_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        """Save the comment and count it on its listing."""
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding and self.listing_id is not None:
+                Listing.objects.filter(pk=self.listing_id).update(comment_count=F("comment_count") + 1)
+
+    def delete(self, *args, **kwargs):
+        listing_id = self.listing_id
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            if listing_id is not None:
+                Listing.objects.filter(pk=listing_id).refresh_comment_counts()
+        return result
+
 class Bid(models.Model):
     price = models.FloatField()
     bidder = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -65,5 +365,52 @@ class Bid(models.Model):
         Listing, on_delete=models.CASCADE, related_name="bids", null=True
     )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["listing", "-price"], name="bid_listing_price_idx"),
+        ]
+
     def __str__(self):
         return f"#{self.id}: ${self.price} for '{self.listing}' by {self.bidder}"
+
+    def save(self, *args, **kwargs):
+        """Save the bid and fold it into the listing's bid summary atomically."""
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if self.listing_id is None:
+                return
+            if not adding:
+                # An edited bid may no longer be the top one, recompute from scratch.
+                Listing.objects.filter(pk=self.listing_id).refresh_bid_summaries()
+                return
+            is_top = Q(current_price__isnull=True) | Q(current_price__lt=self.price)
+            Listing.objects.filter(pk=self.listing_id).update(
+                current_price=Case(
+                    When(is_top, then=Value(self.price)),
+                    default=F("current_price"),
+                    output_field=models.FloatField(),
+                ),
+                current_bidder=Case(
+                    When(is_top, then=Value(self.bidder_id)),
+                    default=F("current_bidder"),
+                    output_field=models.BigIntegerField(),
+                ),
+                bid_count=F("bid_count") + 1,
+                version=F("version") + 1,
+            )
+
+    def delete(self, *args, **kwargs):
+        listing_id = self.listing_id
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            if listing_id is not None:
+                Listing.objects.filter(pk=listing_id).refresh_bid_summaries()
+        return result
+
+class ListingEvent(models.Model):
+    """Cross-process log of live listing events, see auctions.events."""
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name="+")
+    kind = models.CharField(max_length=16)
+    data = models.JSONField(default=dict)
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
@@ -0,0 +1,149 @@
+import base64
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any
+
+from django.conf import settings
+from django.core.exceptions import BadRequest
+from django.db.models import Q, QuerySet
+
+
+DEFAULT_PAGE_SIZE = 25
+# Larger ids overflow SQLite's integers when the cursor is queried.
+MAX_PK = 2**63 - 1
+
+
+@dataclass
+class CursorPage:
+    object_list: list
+    next_cursor: str | None
+    previous_cursor: str | None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self) -> bool:
+        return self.previous_cursor is not None
+
+
+def encode_cursor(value, pk: int) -> str:
+    """Encode a (value, id) sort key as an opaque, URL-safe token."""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([value, pk], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str, parse=datetime.fromisoformat) -> tuple[Any, int]:
+    """Inverse of encode_cursor(), parse converts the JSON value back to its type."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        value, pk = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        pk = int(pk)
+        if not -MAX_PK <= pk <= MAX_PK:
+            raise ValueError("Cursor id out of range.")
+        return parse(value), pk
+    except (ValueError, TypeError) as e:
+        raise BadRequest("Invalid page cursor.") from e
+
+
+def _sort_key(row, field: str) -> tuple[Any, int]:
+    """(field, id) of a model instance or of a .values() dict that includes "id"."""
+    if isinstance(row, dict):
+        return row[field], row["id"]
+    return getattr(row, field), row.pk
+
+
+def get_page_size() -> int:
+    return getattr(settings, "LISTINGS_PAGE_SIZE", DEFAULT_PAGE_SIZE)
+
+
+def _page_queryset(queryset: QuerySet, after, before, page_size: int, field: str) -> QuerySet:
+    """The page_size + 1 rows following the cursor, in scan order."""
+    if before:
+        value, pk = decode_cursor(before)
+        return queryset.filter(
+            Q(**{f"{field}__gt": value}) | Q(**{field: value, "pk__gt": pk})
+        ).order_by(field, "pk")[: page_size + 1]
+    if after:
+        value, pk = decode_cursor(after)
+        queryset = queryset.filter(Q(**{f"{field}__lt": value}) | Q(**{field: value, "pk__lt": pk}))
+    return queryset.order_by(f"-{field}", "-pk")[: page_size + 1]
+
+
+def _build_page(rows: list, after, before, page_size: int, field: str) -> CursorPage:
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if before:
+        rows.reverse()
+        has_next, has_previous = True, has_more
+    else:
+        has_next, has_previous = has_more, bool(after)
+
+    return CursorPage(
+        object_list=rows,
+        next_cursor=encode_cursor(*_sort_key(rows[-1], field)) if rows and has_next else None,
+        previous_cursor=encode_cursor(*_sort_key(rows[0], field)) if rows and has_previous else None,
+    )
+
+
+def paginate(
+    queryset: QuerySet,
+    after: str | None = None,
+    before: str | None = None,
+    page_size: int | None = None,
+    field: str = "date_posted",
+) -> CursorPage:
+    """
+    Keyset-paginate queryset newest first on (field, id).
+
+    Each page is a single indexed range scan of page_size + 1 rows, so page
+    1000 costs the same as page 1. Pass the next_cursor of a page as `after`
+    to move forward and its previous_cursor as `before` to move back.
+    """
+    page_size = page_size or get_page_size()
+    rows = list(_page_queryset(queryset, after, before, page_size, field))
+    return _build_page(rows, after, before, page_size, field)
+
+
+async def apaginate(
+    queryset: QuerySet,
+    after: str | None = None,
+    before: str | None = None,
+    page_size: int | None = None,
+    field: str = "date_posted",
+) -> CursorPage:
+    """Async version of paginate()."""
+    page_size = page_size or get_page_size()
+    page_queryset = _page_queryset(queryset, after, before, page_size, field)
+    rows = [row async for row in page_queryset.aiterator(chunk_size=page_size + 1)]
+    return _build_page(rows, after, before, page_size, field)
+
+
+def paginate_request(request, queryset: QuerySet, **kwargs) -> CursorPage:
+    """Paginate queryset using the `after`/`before` cursors from the query string."""
+    return paginate(
+        queryset,
+        after=request.GET.get("after"),
+        before=request.GET.get("before"),
+        **kwargs,
+    )
+
+
+async def apaginate_request(request, queryset: QuerySet, **kwargs) -> CursorPage:
+    """Async version of paginate_request()."""
+    return await apaginate(
+        queryset,
+        after=request.GET.get("after"),
+        before=request.GET.get("before"),
+        **kwargs,
+    )
@@ -0,0 +1,108 @@
+"""
+Automatic closing of listings at their ends_at deadline.
+
+AuctionScheduler keeps a min-heap of the deadlines inside a look-ahead
+window, topped up incrementally from the (status, ends_at) index, and sleeps
+until the earliest one. close_expired() then closes every expired listing in
+one transaction, so a minute with tens of thousands of deadlines costs a
+handful of statements rather than a query per listing.
+"""
+import heapq
+import time
+from datetime import datetime, timedelta
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import events
+from .cache import forget_category_directory
+from .models import Listing
+
+CLOSE_BATCH_SIZE = 500
+
+
+def close_expired(now: datetime | None = None) -> int:
+    """Close every active listing whose ends_at has passed, return how many."""
+    now = now or timezone.now()
+    expired = Listing.objects.filter(status=Listing.Status.ACTIVE, ends_at__lte=now)
+    with transaction.atomic():
+        rows = list(expired.values_list("pk", flat=True))
+        for start in range(0, len(rows), CLOSE_BATCH_SIZE):
+            batch = rows[start:start + CLOSE_BATCH_SIZE]
+            # The winner is the denormalized top bidder, no bids are read.
+            expired.filter(pk__in=batch).update(
+                status=Listing.Status.CLOSED,
+                winner=F("current_bidder"),
+                version=F("version") + 1,
+            )
+        events.publish_many("closed", [(pk, {}) for pk in rows])
+        if rows:
+            forget_category_directory()
+    return len(rows)
+
+
+class AuctionScheduler:
+    def __init__(self, horizon: timedelta = timedelta(minutes=10), refresh: timedelta = timedelta(seconds=30)):
+        self.horizon = horizon
+        self.refresh_interval = refresh
+        self.heap: list[tuple[datetime, int]] = []
+        self.scheduled: set[int] = set()
+        self.loaded_until: datetime | None = None
+        self.last_pk = 0
+        self.next_refresh = timezone.now()
+
+    def refresh(self, now: datetime) -> int:
+        """
+        Push the deadlines up to now + horizon that are not on the heap yet.
+
+        Only the slice of the (status, ends_at) index beyond what was loaded
+        last time is read, plus listings created since then, which may end
+        inside the window already covered.
+        """
+        until = now + self.horizon
+        window = Q(ends_at__lte=until)
+        if self.loaded_until is not None:
+            window &= Q(ends_at__gt=self.loaded_until) | Q(pk__gt=self.last_pk)
+        # Read before the window so a listing committed while it loads keeps a
+        # pk above last_pk and is picked up by the next refresh.
+        newest = Listing.objects.order_by("-pk").values_list("pk", flat=True).first()
+        rows = Listing.objects.filter(window, status=Listing.Status.ACTIVE).values_list("pk", "ends_at")
+        added = 0
+        for pk, ends_at in rows.iterator(chunk_size=2000):
+            self.last_pk = max(self.last_pk, pk)
+            if pk not in self.scheduled:
+                heapq.heappush(self.heap, (ends_at, pk))
+                self.scheduled.add(pk)
+                added += 1
+        self.last_pk = max(self.last_pk, newest or 0)
+        self.loaded_until = until
+        self.next_refresh = now + self.refresh_interval
+        return added
+
+    def tick(self, now: datetime) -> int:
+        """Close everything that is due, return how many listings were closed."""
+        if now >= self.next_refresh:
+            self.refresh(now)
+        if not self.heap or self.heap[0][0] > now:
+            return 0
+        while self.heap and self.heap[0][0] <= now:
+            _, pk = heapq.heappop(self.heap)
+            self.scheduled.discard(pk)
+        # Closes by condition rather than by the popped ids, so deadlines that
+        # were moved earlier since the last refresh are caught as well.
+        return close_expired(now)
+
+    def seconds_until_next(self, now: datetime) -> float:
+        wake = self.next_refresh
+        if self.heap:
+            wake = min(wake, self.heap[0][0])
+        return max((wake - now).total_seconds(), 0.0)
+
+    def run(self, on_close=None, max_sleep: float = 60.0) -> None:
+        """Tick forever, calling on_close(count) after every batch of closes."""
+        while True:
+            closed = self.tick(timezone.now())
+            if closed and on_close is not None:
+                on_close(closed)
+            time.sleep(min(self.seconds_until_next(timezone.now()), max_sleep))
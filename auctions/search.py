@@ -0,0 +1,144 @@
+"""
+Full-text listing search on an SQLite FTS5 index.
+
+auctions_listing_fts is an external-content FTS5 table over
+Listing.title/description, kept in sync by triggers on auctions_listing and
+rebuilt with `manage.py rebuild_search_index`. SQLite drops those triggers
+whenever a migration remakes auctions_listing, so install_triggers() puts
+them back after every migrate (see AuctionsConfig.ready()). Results are ranked
+with BM25 (title matches weigh more) and keyset-paginated on (rank, id).
+"""
+import re
+
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+
+from .models import Listing
+from .pagination import CursorPage, decode_cursor, encode_cursor, get_page_size
+
+FTS_TABLE = "auctions_listing_fts"
+TITLE_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+MAX_TERMS = 8
+# Shortest term matched as a prefix. The index keeps 2 and 3 character
+# prefixes (migration 0017); a 1 character prefix would scan every term.
+MIN_PREFIX_LENGTH = 2
+
+_TERM = re.compile(r"\w+", re.UNICODE)
+
+TRIGGERS = {
+    f"{FTS_TABLE}_insert": f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON auctions_listing BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, title, description) VALUES (new.id, new.title, new.description);
+        END
+    """,
+    f"{FTS_TABLE}_delete": f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON auctions_listing BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description)
+            VALUES ('delete', old.id, old.title, old.description);
+        END
+    """,
+    f"{FTS_TABLE}_update": f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update AFTER UPDATE OF title, description ON auctions_listing BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description)
+            VALUES ('delete', old.id, old.title, old.description);
+            INSERT INTO {FTS_TABLE}(rowid, title, description) VALUES (new.id, new.title, new.description);
+        END
+    """,
+}
+
+
+def build_match_query(query: str) -> str:
+    """
+    Turn free text into a safe FTS5 MATCH expression.
+
+    Every word becomes a quoted term, so FTS5 operators typed by users are
+    matched literally, and words of MIN_PREFIX_LENGTH or more characters match
+    as prefixes: "bicy red" finds "Red bicycle".
+    """
+    terms = _TERM.findall(query)[:MAX_TERMS]
+    return " ".join(f'"{term}"*' if len(term) >= MIN_PREFIX_LENGTH else f'"{term}"' for term in terms)
+
+
+def search_listings(
+    query: str,
+    user=None,
+    after: str | None = None,
+    before: str | None = None,
+    page_size: int | None = None,
+    status: int = Listing.Status.ACTIVE,
+) -> CursorPage:
+    """Return one page of listings matching query, best match first."""
+    page_size = page_size or get_page_size()
+    match = build_match_query(query)
+    if not match:
+        return CursorPage(object_list=[], next_cursor=None, previous_cursor=None)
+
+    rank = f"bm25({FTS_TABLE}, {TITLE_WEIGHT}, {DESCRIPTION_WEIGHT})"
+    sql = [
+        f"SELECT l.id, {rank} FROM {FTS_TABLE} JOIN auctions_listing l ON l.id = {FTS_TABLE}.rowid",
+        f"WHERE {FTS_TABLE} MATCH %s AND l.status = %s",
+    ]
+    params = [match, status]
+    if before:
+        value, pk = decode_cursor(before, parse=float)
+        sql.append(f"AND ({rank} < %s OR ({rank} = %s AND l.id < %s))")
+        sql.append(f"ORDER BY {rank} DESC, l.id DESC LIMIT %s")
+    else:
+        if after:
+            value, pk = decode_cursor(after, parse=float)
+            sql.append(f"AND ({rank} > %s OR ({rank} = %s AND l.id > %s))")
+        sql.append(f"ORDER BY {rank}, l.id LIMIT %s")
+    if after or before:
+        params += [value, value, pk]
+    params.append(page_size + 1)
+
+    with connection.cursor() as cursor:
+        cursor.execute(" ".join(sql), params)
+        hits = cursor.fetchall()
+
+    has_more = len(hits) > page_size
+    hits = hits[:page_size]
+    if before:
+        hits.reverse()
+        has_next, has_previous = True, has_more
+    else:
+        has_next, has_previous = has_more, bool(after)
+
+    listings = Listing.objects.filter(pk__in=[pk for pk, _ in hits]).for_cards(user).in_bulk()
+    rows = [listings[pk] for pk, _ in hits if pk in listings]
+
+    return CursorPage(
+        object_list=rows,
+        next_cursor=encode_cursor(*hits[-1][::-1]) if hits and has_next else None,
+        previous_cursor=encode_cursor(*hits[0][::-1]) if hits and has_previous else None,
+    )
+
+
+def install_triggers(using: str = DEFAULT_DB_ALIAS) -> bool:
+    """
+    Create whichever sync triggers are missing and, if any were, rebuild the
+    index, which missed every change made without them. Returns whether
+    anything had to be done.
+    """
+    db = connections[using]
+    if db.vendor != "sqlite" or FTS_TABLE not in db.introspection.table_names():
+        return False
+    with db.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'auctions_listing'"
+        )
+        missing = set(TRIGGERS) - {name for (name,) in cursor.fetchall()}
+        if not missing:
+            return False
+        for name in sorted(missing):
+            cursor.execute(TRIGGERS[name])
+    rebuild_index(optimize=False, using=using)
+    return True
+
+
+def rebuild_index(optimize: bool = True, using: str = DEFAULT_DB_ALIAS) -> None:
+    """Repopulate the FTS index from auctions_listing, then merge its b-trees."""
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+        if optimize:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
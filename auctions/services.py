@@ -0,0 +1,157 @@
+import random
+import time
+from dataclasses import dataclass
+from enum import Enum
+
+from django.db import OperationalError, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import events
+from .models import Bid, Listing, User
+
+
+MAX_BID_RETRIES = 5
+RETRY_BASE_DELAY = 0.005  # seconds, doubled on every attempt
+
+
+class BidStatus(Enum):
+    ACCEPTED = "accepted"
+    OUTBID = "outbid"
+    REJECTED = "rejected"
+    BUSY = "busy"
+
+
+@dataclass(frozen=True)
+class BidResult:
+    status: BidStatus
+    message: str
+    current_price: float | None = None
+    bid: Bid | None = None
+
+    @property
+    def accepted(self) -> bool:
+        return self.status is BidStatus.ACCEPTED
+
+
+def _is_lock_error(error: OperationalError) -> bool:
+    return "locked" in str(error) or "busy" in str(error)
+
+
+def _validate(listing: Listing, user: User, amount: float) -> BidResult | None:
+    """Cheap checks against the (possibly stale) listing snapshot, no locks held."""
+    if listing.author_id == user.pk:
+        return BidResult(BidStatus.REJECTED, "You cannot bid on your own listing.")
+    if listing.status != Listing.Status.ACTIVE or listing.has_ended:
+        return BidResult(BidStatus.REJECTED, "This listing is closed.")
+    if amount <= listing.starting_bid:
+        return BidResult(
+            BidStatus.REJECTED,
+            f"Your bid must be higher than the starting bid (${listing.starting_bid}).",
+        )
+    if listing.current_price is not None and amount <= listing.current_price:
+        return BidResult(
+            BidStatus.OUTBID,
+            f"Your bid must be higher than the current highest bid (${listing.current_price}).",
+            current_price=listing.current_price,
+        )
+    return None
+
+
+def _try_place_bid(listing: Listing, user: User, amount: float) -> BidResult:
+    with transaction.atomic():
+        # Compare-and-set: the UPDATE is the first statement of the transaction,
+        # so the write lock is taken once, only for as long as two statements.
+        won = (
+            Listing.objects.filter(pk=listing.pk, status=Listing.Status.ACTIVE, starting_bid__lt=amount)
+            .filter(Q(current_price__isnull=True) | Q(current_price__lt=amount))
+            .filter(Q(ends_at__isnull=True) | Q(ends_at__gt=timezone.now()))
+            .exclude(current_bidder=user)
+            .update(
+                current_price=amount,
+                current_bidder=user,
+                bid_count=F("bid_count") + 1,
+                version=F("version") + 1,
+            )
+        )
+        if won:
+            # bulk_create skips Bid.save(), whose summary update the CAS above already did.
+            (bid,) = Bid.objects.bulk_create([Bid(price=amount, bidder=user, listing_id=listing.pk)])
+            # The count as of this bid, read under the write lock the CAS took,
+            # so a client that missed events can still show it exactly.
+            bid_count = Listing.objects.filter(pk=listing.pk).values_list("bid_count", flat=True).get()
+            # Who bid is not published, the stream is readable by every user.
+            events.publish(listing.pk, "bid", price=amount, bid_count=bid_count)
+            return BidResult(BidStatus.ACCEPTED, "Bid successful!", current_price=amount, bid=bid)
+
+    current = (
+        Listing.objects.filter(pk=listing.pk)
+        .values("status", "ends_at", "current_price", "current_bidder")
+        .first()
+    )
+    if (
+        current is None
+        or current["status"] != Listing.Status.ACTIVE
+        or (current["ends_at"] is not None and current["ends_at"] <= timezone.now())
+    ):
+        return BidResult(BidStatus.REJECTED, "This listing is closed.")
+    if current["current_bidder"] == user.pk:
+        return BidResult(
+            BidStatus.REJECTED, "Your bid is already the highest bid!", current_price=current["current_price"]
+        )
+    return BidResult(
+        BidStatus.OUTBID,
+        f"You were outbid, the current highest bid is ${current['current_price']}.",
+        current_price=current["current_price"],
+    )
+
+
+def place_bid(listing: Listing, user: User, amount: float, max_retries: int = MAX_BID_RETRIES) -> BidResult:
+    """
+    Place a bid of amount on listing for user.
+
+    The bid is validated against the listing snapshot without taking any lock,
+    then committed with a conditional UPDATE that only succeeds if amount still
+    beats the stored current price. Losing that race yields an OUTBID result
+    instead of a duplicate or out-of-order bid. Lock contention is retried with
+    jittered exponential backoff up to max_retries times before giving up with
+    a BUSY result. The listing instance passed in is not refreshed.
+    """
+    amount = float(amount)
+    rejected = _validate(listing, user, amount)
+    if rejected is not None:
+        return rejected
+
+    for attempt in range(max_retries + 1):
+        try:
+            return _try_place_bid(listing, user, amount)
+        except OperationalError as e:
+            # Inside an outer atomic block the transaction is already broken
+            # and cannot be retried from here.
+            if not _is_lock_error(e) or connection.in_atomic_block:
+                raise
+            if attempt == max_retries:
+                break
+            time.sleep(RETRY_BASE_DELAY * 2**attempt * random.uniform(0.5, 1.5))
+
+    return BidResult(BidStatus.BUSY, "Bidding is very busy right now, please try again.")
+
+
+def toggle_watch(listing: Listing, user: User) -> bool:
+    """
+    Add listing to user's watchlist, or remove it if it is already there.
+
+    Membership is a single lookup on the (listing, user) unique index of the
+    through table rather than loading every watcher. Returns whether the
+    user watches the listing afterwards.
+    """
+    Watcher = Listing.watchers.through
+    with transaction.atomic():
+        removed, _ = Watcher.objects.filter(listing_id=listing.pk, user_id=user.pk).delete()
+        if not removed:
+            Watcher.objects.create(listing_id=listing.pk, user_id=user.pk)
+        Listing.objects.filter(pk=listing.pk).update(
+            watcher_count=F("watcher_count") + (-1 if removed else 1),
+            version=F("version") + 1,
+        )
+    return not removed
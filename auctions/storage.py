@@ -0,0 +1,92 @@
+"""
+Content-addressed file storage for uploads.
+
+ContentAddressedStorage streams every new file to a temporary file while
+hashing it, then names it after its SHA-256 digest, sharded two levels deep
+so no directory grows past a few thousand entries:
+
+    listing_images/photo.JPG -> listing_images/3f/a2/3fa2...9c.jpg
+
+Identical uploads therefore land on the same name and are stored once.
+Names that already sit under their digest, such as the resized variants
+images.generate_variants() writes next to an original
+(listing_images/3f/a2/3fa2...9c_260w.jpg), are stored as given, and so is
+anything saved with save_exact().
+
+A stored file may back any number of listings, so it is only deleted once
+none refers to it any more, see Listing.delete().
+"""
+import hashlib
+import os
+import secrets
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.core.files.utils import validate_file_name
+
+HASH_LENGTH = 64  # hex digits of a SHA-256 digest
+_HEX_DIGITS = frozenset("0123456789abcdef")
+
+
+def addressed_name(directory: str, digest: str, ext: str) -> str:
+    return "/".join(filter(None, (directory, digest[:2], digest[2:4], digest + ext.lower())))
+
+
+def is_addressed(name: str) -> bool:
+    """Whether name lies under the shard directories of the digest it starts with."""
+    parts = name.replace("\\", "/").split("/")
+    if len(parts) < 3:
+        return False
+    shard1, shard2, filename = parts[-3:]
+    digest = filename[:HASH_LENGTH]
+    return len(digest) == HASH_LENGTH and set(digest) <= _HEX_DIGITS and digest[:4] == shard1 + shard2
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def __init__(self, **kwargs):
+        # Addressed names only ever hold their own content, and variants are
+        # regenerated in place, so there is nothing to protect by renaming.
+        kwargs.setdefault("allow_overwrite", True)
+        super().__init__(**kwargs)
+
+    def save_exact(self, name, content) -> str:
+        """Store content under name itself, e.g. a variant next to its original."""
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+        validate_file_name(name, allow_relative_path=True)
+        return super()._save(name, content)
+
+    def _save(self, name, content):
+        if is_addressed(name):
+            return super()._save(name, content)
+
+        directory = os.path.dirname(name)
+        ext = os.path.splitext(name)[1]
+        os.makedirs(self.path(directory), exist_ok=True)
+        if self.directory_permissions_mode is not None:
+            os.chmod(self.path(directory), self.directory_permissions_mode)
+        incoming = self.path(os.path.join(directory, f".incoming-{secrets.token_hex(8)}{ext}"))
+
+        digest = hashlib.sha256()
+        fd = os.open(incoming, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0), 0o666)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    f.write(chunk)
+            stored = addressed_name(directory, digest.hexdigest(), ext)
+            target = self.path(stored)
+            if os.path.exists(target):
+                os.remove(incoming)  # already stored by an earlier upload
+            else:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                if self.file_permissions_mode is not None:
+                    os.chmod(incoming, self.file_permissions_mode)
+                # Atomic, so readers never see a partly written file and two
+                # concurrent uploads of the same bytes simply both succeed.
+                os.replace(incoming, target)
+        except BaseException:
+            if os.path.exists(incoming):
+                os.remove(incoming)
+            raise
+        return stored
@@ -0,0 +1,1302 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+from contextlib import closing
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.models import QuerySet
+from django.http import Http404, HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+from PIL import Image
+
+from commerce import staticfiles
+from commerce.asgi import CommerceASGIHandler
+from commerce.media import serve_media
+from commerce.replicas import PIN_COOKIE, ReplicaRouter, ReplicaRoutingMiddleware
+from commerce.staticfiles import CompressedManifestStaticFilesStorage, StaticFilesMiddleware
+
+from . import async_views, events, views
+from .categories import get_category
+from .images import variant_names
+from .models import Bid, Category, Comment, Listing, ListingEvent, User, release_image
+from .pagination import encode_cursor, paginate
+from .scheduler import AuctionScheduler, close_expired
+from .search import TRIGGERS, build_match_query, install_triggers, search_listings
+from .services import BidStatus, place_bid, toggle_watch
+from .storage import ContentAddressedStorage, is_addressed
+from .uploads import RejectedUpload
+
+
+class PlaceBidTests(TestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user("seller", password="x")
+        self.alice = User.objects.create_user("alice", password="x")
+        self.bob = User.objects.create_user("bob", password="x")
+        self.listing = Listing.objects.create(
+            title="Bicycle", description="Red", author=self.seller, starting_bid=10
+        )
+
+    def test_accepted_bid_updates_listing(self):
+        result = place_bid(self.listing, self.alice, 12)
+        self.assertEqual(result.status, BidStatus.ACCEPTED)
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.current_price, 12)
+        self.assertEqual(self.listing.current_bidder, self.alice)
+        self.assertEqual(self.listing.bid_count, 1)
+
+    def test_stale_snapshot_is_outbid(self):
+        stale = Listing.objects.get(pk=self.listing.pk)
+        place_bid(self.listing, self.alice, 20)
+        result = place_bid(stale, self.bob, 15)
+        self.assertEqual(result.status, BidStatus.OUTBID)
+        self.assertEqual(result.current_price, 20)
+        self.assertEqual(Bid.objects.count(), 1)
+
+    def test_rejections(self):
+        self.assertEqual(place_bid(self.listing, self.seller, 50).status, BidStatus.REJECTED)
+        self.assertEqual(place_bid(self.listing, self.alice, 10).status, BidStatus.REJECTED)
+        place_bid(self.listing, self.alice, 11)
+        self.listing.refresh_from_db()
+        self.assertEqual(place_bid(self.listing, self.alice, 30).status, BidStatus.REJECTED)
+
+    def test_closing_awards_the_bid_placed_after_the_listing_was_loaded(self):
+        place_bid(self.listing, self.alice, 12)
+        load = views.get_object_or_404
+
+        def load_then_outbid(*args, **kwargs):
+            listing = load(*args, **kwargs)
+            place_bid(Listing.objects.get(pk=self.listing.pk), self.bob, 15)
+            return listing
+
+        self.client.force_login(self.seller)
+        url = reverse("close_listing", args=[self.listing.pk])
+        with mock.patch.object(views, "get_object_or_404", load_then_outbid), \
+                mock.patch.object(events, "publish") as publish:
+            self.client.post(url)
+        self.listing.refresh_from_db()
+        self.assertEqual((self.listing.status, self.listing.winner), (Listing.Status.CLOSED, self.bob))
+        self.assertEqual(publish.call_args_list[-1:], [mock.call(self.listing.pk, "closed")])
+
+        with mock.patch.object(events, "publish") as publish:
+            self.client.post(url)
+        publish.assert_not_called()
+        self.assertEqual(Listing.objects.get(pk=self.listing.pk).version, self.listing.version)
+
+
+class BidSummaryTests(TestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user("seller", password="x")
+        self.alice = User.objects.create_user("alice", password="x")
+        self.bob = User.objects.create_user("bob", password="x")
+        self.listing = Listing.objects.create(
+            title="Bicycle", description="Red", author=self.seller, starting_bid=10
+        )
+
+    def bid(self, bidder, price):
+        return Bid.objects.create(listing=self.listing, bidder=bidder, price=price)
+
+    def summary(self):
+        self.listing.refresh_from_db()
+        return (self.listing.current_price, self.listing.current_bidder, self.listing.bid_count)
+
+    def test_lower_bid_keeps_the_top_bid(self):
+        self.bid(self.alice, 20)
+        self.bid(self.bob, 15)
+        self.assertEqual(self.summary(), (20, self.alice, 2))
+
+    def test_edited_bid_is_recomputed(self):
+        top = self.bid(self.alice, 20)
+        self.bid(self.bob, 15)
+        top.price = 12
+        top.save()
+        self.assertEqual(self.summary(), (15, self.bob, 2))
+
+    def test_deleting_the_top_bid_falls_back_to_the_next(self):
+        top = self.bid(self.alice, 20)
+        self.bid(self.bob, 15)
+        top.delete()
+        self.assertEqual(self.summary(), (15, self.bob, 1))
+        Bid.objects.get().delete()
+        self.assertEqual(self.summary(), (None, None, 0))
+
+    def test_rebuild_command_repairs_corrupted_columns(self):
+        self.bid(self.alice, 20)
+        self.bid(self.bob, 15)
+        self.listing.watchers.add(self.bob)
+        Comment.objects.create(listing=self.listing, author=self.bob, content="Still available?")
+        Listing.objects.filter(pk=self.listing.pk).update(
+            current_price=99, current_bidder=self.bob, bid_count=7, watcher_count=3, comment_count=4
+        )
+        call_command("rebuild_bid_summaries", stdout=StringIO())
+        self.assertEqual(self.summary(), (20, self.alice, 2))
+        self.assertEqual((self.listing.watcher_count, self.listing.comment_count), (1, 1))
+
+
+class PaginationTests(TestCase):
+    def setUp(self):
+        seller = User.objects.create_user("seller", password="x")
+        for i in range(7):
+            Listing.objects.create(title=f"Item {i}", description="", author=seller, starting_bid=1)
+        # Four listings share a timestamp, only the id orders them.
+        tie = timezone.now()
+        Listing.objects.filter(pk__in=Listing.objects.order_by("pk").values("pk")[1:5]).update(date_posted=tie)
+        self.ids = list(Listing.objects.order_by("-date_posted", "-pk").values_list("pk", flat=True))
+
+    def test_cursors_round_trip_across_ties(self):
+        pages, cursor = [], None
+        while True:
+            page = paginate(Listing.objects.all(), after=cursor, page_size=2)
+            pages.append([listing.pk for listing in page])
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        self.assertEqual([pk for ids in pages for pk in ids], self.ids)
+
+        # Walking back with previous_cursor yields the same pages in reverse.
+        back = [pages[-1]]
+        page = paginate(Listing.objects.all(), after=cursor, page_size=2)
+        while page.has_previous:
+            page = paginate(Listing.objects.all(), before=page.previous_cursor, page_size=2)
+            back.append([listing.pk for listing in page])
+        self.assertEqual(back, pages[::-1])
+
+    @override_settings(LISTINGS_PAGE_SIZE=3)
+    def test_page_size_setting(self):
+        page = paginate(Listing.objects.all())
+        self.assertEqual([listing.pk for listing in page], self.ids[:3])
+        self.assertFalse(page.has_previous)
+
+    def test_malformed_cursors_are_bad_requests(self):
+        for cursor in ("garbage", encode_cursor("not a date", 1), encode_cursor(timezone.now(), 2**70)):
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self.client.get("/", {"after": cursor}).status_code, 400)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user("seller", password="x")
+
+    def create(self, title, description=""):
+        return Listing.objects.create(title=title, description=description, author=self.seller, starting_bid=1)
+
+    def found(self, query, **kwargs):
+        return [listing.pk for listing in search_listings(query, **kwargs)]
+
+    def test_title_matches_rank_first_and_words_match_as_prefixes(self):
+        in_description = self.create("Lamp", "Fits on a bicycle rack")
+        in_title = self.create("Red bicycle")
+        self.create("Kettle")
+        self.assertEqual(self.found("bicy"), [in_title.pk, in_description.pk])
+        self.assertEqual(self.found("red BICYCLE"), [in_title.pk])
+        self.assertEqual(self.found('bicycle" OR "kettle'), [])
+
+    def test_single_characters_are_not_prefix_terms(self):
+        self.assertEqual(build_match_query("a bi"), '"a" "bi"*')
+        self.create("Bicycle")
+        self.assertEqual(self.found("b"), [])
+
+    def test_index_follows_updates_and_deletes(self):
+        listing = self.create("Bicycle")
+        listing.title = "Tandem"
+        listing.save()
+        self.assertEqual(self.found("bicycle"), [])
+        self.assertEqual(self.found("tandem"), [listing.pk])
+        listing.delete()
+        self.assertEqual(self.found("tandem"), [])
+
+    def test_install_triggers_restores_dropped_triggers(self):
+        # What SQLite does to them whenever a migration remakes auctions_listing
+        with connection.cursor() as cursor:
+            for name in TRIGGERS:
+                cursor.execute(f"DROP TRIGGER {name}")
+        listing = self.create("Bicycle")
+        self.assertEqual(self.found("bicycle"), [])
+        self.assertIs(install_triggers(), True)
+        self.assertEqual(self.found("bicycle"), [listing.pk])
+        listing.delete()
+        self.assertEqual(self.found("bicycle"), [])
+        self.assertIs(install_triggers(), False)
+
+    def test_rank_keyset_pages(self):
+        for i in range(5):
+            self.create(f"Bicycle {i}", "bicycle " * i)
+        expected = self.found("bicycle", page_size=10)
+        pages, page = [], search_listings("bicycle", page_size=2)
+        while True:
+            pages.append([listing.pk for listing in page])
+            if not page.has_next:
+                break
+            page = search_listings("bicycle", after=page.next_cursor, page_size=2)
+        self.assertEqual([pk for ids in pages for pk in ids], expected)
+        back = search_listings("bicycle", before=page.previous_cursor, page_size=2)
+        self.assertEqual([listing.pk for listing in back], pages[-2])
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user("seller", password="x")
+        bikes = Category.objects.create(name="Bikes")
+        self.listing = Listing.objects.create(
+            title="Bicycle", description="Red", author=self.seller, starting_bid=10, category=bikes
+        )
+        Listing.objects.create(title="Lamp", description="", author=self.seller, starting_bid=5)
+        Comment.objects.create(listing=self.listing, author=self.seller, content="Still available")
+        cache.clear()
+
+    def test_asgi_handler_routes_through_the_async_urlconf(self):
+        scope = {"type": "http", "method": "GET", "path": "/", "query_string": b"", "headers": []}
+        request, error = CommerceASGIHandler().create_request(scope, BytesIO())
+        self.assertIsNone(error)
+        self.assertEqual(request.urlconf, "commerce.urls_async")
+        self.assertIs(resolve("/", urlconf=request.urlconf).func, async_views.index)
+        self.assertIs(resolve("/closed/", urlconf=request.urlconf).func, views.closed_listings)
+
+    @staticmethod
+    def summarize(context) -> dict:
+        """The parts of a listing page's context both view flavours must agree on."""
+        summary = {"title": context.get("title"), "listing": getattr(context.get("listing"), "pk", None)}
+        for key in ("listings", "comments"):
+            if key in context:
+                summary[key] = [row.pk for row in context[key]]
+        return summary
+
+    async def test_views_render_what_the_sync_views_do(self):
+        await self.async_client.aforce_login(self.seller)
+        await self.client.aforce_login(self.seller)
+        for url in ("/", "/category/Bikes/", f"/listing/{self.listing.pk}/"):
+            with self.subTest(url=url):
+                expected = self.summarize((await sync_to_async(self.client.get)(url)).context)
+                with override_settings(ROOT_URLCONF="commerce.urls_async"):
+                    response = await self.async_client.get(url)
+                    # resolver_match is lazy, resolve it under the same urlconf.
+                    self.assertEqual(response.resolver_match.func.__module__, "auctions.async_views")
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(self.summarize(response.context), expected)
+                self.assertTrue(expected.get("listings") or expected.get("comments"))
+
+    @override_settings(ROOT_URLCONF="commerce.urls_async")
+    async def test_unknown_category_and_anonymous_detail(self):
+        self.assertEqual((await self.async_client.get("/category/Nope/")).status_code, 404)
+        url = f"/listing/{self.listing.pk}/"
+        response = await self.async_client.get(url)
+        self.assertRedirects(response, f"/login/?next={url}", fetch_redirect_response=False)
+
+
+class ListingEventTests(TestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user("seller", password="x")
+        self.alice = User.objects.create_user("alice", password="x")
+        self.listing = Listing.objects.create(
+            title="Bicycle", description="Red", author=self.seller, starting_bid=10
+        )
+
+    async def snapshot(self):
+        return {"price": 10, "bid_count": 0, "status": "active"}
+
+    def test_bid_events_carry_the_count_but_not_the_bidder(self):
+        with override_settings(AUCTION_EVENTS_BACKEND="database"):
+            place_bid(self.listing, self.alice, 12)
+        event = ListingEvent.objects.get()
+        self.assertEqual((event.kind, event.data), ("bid", {"price": 12, "bid_count": 1}))
+
+    async def test_stream_sends_state_events_and_heartbeats_until_close(self):
+        stream = events.stream(self.listing.pk, self.snapshot)
+        with override_settings(AUCTION_EVENTS_HEARTBEAT=0.01):
+            self.assertEqual(await anext(stream), 'event: state\ndata: {"type":"state","price":10,"bid_count":0,"status":"active"}\n\n')
+            self.assertEqual(await anext(stream), ": heartbeat\n\n")
+            events.broker.dispatch(self.listing.pk, {"type": "bid", "price": 12, "bid_count": 1})
+            self.assertEqual(await anext(stream), 'event: bid\ndata: {"type":"bid","price":12,"bid_count":1}\n\n')
+            events.broker.dispatch(self.listing.pk, {"type": "closed"})
+            self.assertEqual(await anext(stream), 'event: closed\ndata: {"type":"closed"}\n\n')
+            with self.assertRaises(StopAsyncIteration):
+                await anext(stream)
+        self.assertNotIn(self.listing.pk, events.broker.subscriptions)
+
+    async def test_slow_subscribers_lose_their_oldest_events(self):
+        subscription = events.broker.subscribe(self.listing.pk)
+        try:
+            for count in range(1, events.QUEUE_SIZE + 4):
+                subscription.offer({"type": "bid", "price": 10 + count, "bid_count": count})
+            self.assertEqual(subscription.dropped, 3)
+            self.assertEqual((await subscription.get(timeout=1))["bid_count"], 4)
+        finally:
+            subscription.close()
+
+    async def test_database_backend_fans_out_new_rows(self):
+        with override_settings(AUCTION_EVENTS_BACKEND="database"):
+            stream = events.stream(self.listing.pk, self.snapshot)
+            await anext(stream)
+            await ListingEvent.objects.acreate(listing=self.listing, kind="bid", data={"price": 12, "bid_count": 1})
+            message = await asyncio.wait_for(anext(stream), timeout=5)
+            await stream.aclose()
+            await events.broker.poller  # stops with its last subscriber
+        self.assertEqual(message, 'event: bid\ndata: {"type":"bid","price":12,"bid_count":1}\n\n')
+
+    def test_stream_is_only_offered_under_asgi(self):
+        self.client.force_login(self.alice)
+        response = self.client.get(f"/listing/{self.listing.pk}/")
+        self.assertNotContains(response, "EventSource")
+        self.assertEqual(self.client.get(f"/listing/{self.listing.pk}/events/").status_code, 204)
+
+    @override_settings(ROOT_URLCONF="commerce.urls_async")
+    async def test_asgi_detail_subscribes_logged_in_users(self):
+        url = f"/listing/{self.listing.pk}/events/"
+        response = await self.async_client.get(url)
+        self.assertRedirects(response, f"/login/?next={url}", fetch_redirect_response=False)
+        await self.async_client.aforce_login(self.alice)
+        response = await self.async_client.get(f"/listing/{self.listing.pk}/")
+        self.assertContains(response, f'new EventSource("{url}")')
+
+
+class GridQueryCountTests(TestCase):
+    URLS = ("/", "/category/Bikes/", "/watchlist/", "/search/?q=bicycle")
+
+    def setUp(self):
+        self.seller = User.objects.create_user("seller", password="x")
+        self.alice = User.objects.create_user("alice", password="x")
+        self.bikes = Category.objects.create(name="Bikes")
+        self.client.force_login(self.alice)
+
+    def add_listings(self, count):
+        listings = Listing.objects.bulk_create([
+            Listing(
+                title=f"Bicycle {i}", description="Red", author=self.seller, starting_bid=10,
+                category=self.bikes, current_price=12, current_bidder=self.alice, bid_count=1,
+            )
+            for i in range(count)
+        ])
+        Listing.watchers.through.objects.bulk_create(
+            [Listing.watchers.through(listing=listing, user=self.alice) for listing in listings]
+        )
+
+    def get(self, url):
+        # Cold card cache, so every card is rendered.
+        cache.clear()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_grid_pages_run_a_fixed_number_of_queries(self):
+        self.add_listings(5)
+        counts = {}
+        for url in self.URLS:
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(len(self.get(url).context["listings"]), 5)
+            counts[url] = len(queries)
+
+        self.add_listings(95)
+        for url in self.URLS:
+            with self.subTest(url=url), self.assertNumQueries(counts[url]):
+                self.assertEqual(len(self.get(url).context["listings"]), settings.LISTINGS_PAGE_SIZE)
+
+
+class ListingCardCacheTests(TestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user("seller", password="x")
+        self.alice = User.objects.create_user("alice", password="x")
+        self.listing = Listing.objects.create(
+            title="Lamp", description="", author=self.seller, starting_bid=5,
+            ends_at=timezone.now() + timedelta(hours=1),
+        )
+        self.client.force_login(self.seller)
+        cache.clear()
+
+    def rename(self, title):
+        """Change the title behind the card cache's back, without a version bump."""
+        Listing.objects.filter(pk=self.listing.pk).update(title=title)
+
+    def test_cards_are_rendered_again_after_a_version_bump(self):
+        self.assertContains(self.client.get("/"), "Lamp")
+        self.rename("Desk lamp")
+        self.assertNotContains(self.client.get("/"), "Desk lamp")
+
+        bumps = [
+            ("bid", lambda: place_bid(self.listing, self.alice, 6)),
+            ("watch", lambda: toggle_watch(self.listing, self.alice)),
+            ("close", lambda: close_expired(timezone.now() + timedelta(hours=2))),
+        ]
+        for name, bump in bumps:
+            with self.subTest(name):
+                self.rename(f"Lamp after {name}")
+                bump()
+                self.assertContains(self.client.get("/closed/" if name == "close" else "/"), f"Lamp after {name}")
+
+
+class WatchlistTests(TestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user("seller", password="x")
+        self.alice = User.objects.create_user("alice", password="x")
+        self.listing = Listing.objects.create(
+            title="Bicycle", description="Red", author=self.seller, starting_bid=10
+        )
+
+    def test_toggle_keeps_watcher_count(self):
+        self.assertTrue(toggle_watch(self.listing, self.alice))
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.watcher_count, 1)
+        self.assertFalse(toggle_watch(self.listing, self.alice))
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.watcher_count, 0)
+        self.assertFalse(self.listing.watchers.exists())
+
+    def test_related_managers_and_user_deletes_keep_watcher_count(self):
+        bob = User.objects.create_user("bob", password="x")
+
+        def count():
+            self.listing.refresh_from_db()
+            return self.listing.watcher_count
+
+        self.listing.watchers.add(self.alice, bob)
+        self.assertEqual(count(), 2)
+        self.listing.watchers.remove(self.alice)
+        self.assertEqual(count(), 1)
+        self.alice.watchlist.add(self.listing)
+        self.assertEqual(count(), 2)
+        self.alice.watchlist.clear()
+        self.assertEqual(count(), 1)
+        bob.delete()
+        self.assertEqual(count(), 0)
+        self.listing.watchers.set([self.alice])
+        self.assertEqual(count(), 1)
+        self.listing.watchers.clear()
+        self.assertEqual(count(), 0)
+
+    def test_json_endpoint(self):
+        url = f"/listing/{self.listing.pk}/watch/"
+        self.assertEqual(self.client.post(url).status_code, 401)
+        self.client.force_login(self.alice)
+        self.assertEqual(self.client.post(url).json(), {"watching": True, "watchers": 1})
+        self.assertEqual(self.client.post(url).json(), {"watching": False, "watchers": 0})
+
+
+class ApiTests(TestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user("seller", password="x")
+        self.alice = User.objects.create_user("alice", password="x")
+        self.listing = Listing.objects.create(
+            title="Bicycle", description="Red", author=self.seller, starting_bid=10
+        )
+
+    def test_etags_revalidate_until_a_bid(self):
+        bob = User.objects.create_user("bob", password="x")
+        for url, bidder, price in (
+            ("/api/v1/listings/", self.alice, 12), (f"/api/v1/listings/{self.listing.pk}/", bob, 13)
+        ):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                etag = response["ETag"]
+                self.assertEqual(self.client.get(url, headers={"if-none-match": etag}).status_code, 304)
+                self.assertEqual(place_bid(self.listing, bidder, price).status, BidStatus.ACCEPTED)
+                response = self.client.get(url, headers={"if-none-match": etag})
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response["ETag"], etag)
+
+    def test_recent_bids_do_not_name_bidders(self):
+        place_bid(self.listing, self.alice, 12)
+        data = self.client.get(f"/api/v1/listings/{self.listing.pk}/").json()
+        self.assertEqual(data["recent_bids"], [{"price": 12.0}])
+        self.assertNotIn("alice", str(data))
+
+    def test_bad_parameters(self):
+        for query in ("status=open", "limit=ten"):
+            with self.subTest(query=query):
+                response = self.client.get(f"/api/v1/listings/?{query}")
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("error", response.json())
+
+
+@override_settings(COMMENTS_PAGE_SIZE=2)
+class CommentPaginationTests(TestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user("seller", password="x")
+        self.listing = Listing.objects.create(
+            title="Bicycle", description="Red", author=self.seller, starting_bid=10
+        )
+        self.comments = [
+            Comment.objects.create(listing=self.listing, author=self.seller, content=f"Comment {i}")
+            for i in range(5)
+        ]
+        self.client.force_login(self.seller)
+
+    def test_comment_count(self):
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.comment_count, 5)
+        self.comments[0].delete()
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.comment_count, 4)
+
+    def test_detail_shows_newest_page(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f"/listing/{self.listing.pk}/")
+        # User, listing, comments. The session's own queries depend on
+        # SESSION_ENGINE, see SessionStorageTests.
+        self.assertEqual(len([q for q in queries if "django_session" not in q["sql"]]), 3)
+        self.assertEqual([c.content for c in response.context["comments"]], ["Comment 4", "Comment 3"])
+        self.assertContains(response, "Load older comments")
+
+    def test_older_comments_endpoint(self):
+        url = f"/listing/{self.listing.pk}/comments/"
+        first = self.client.get(url, HTTP_ACCEPT="application/json").json()
+        self.assertEqual([c["content"] for c in first["results"]], ["Comment 4", "Comment 3"])
+        fragment = self.client.get(url, {"after": first["next"]}, HTTP_ACCEPT="text/html")
+        self.assertContains(fragment, "Comment 2")
+        self.assertContains(fragment, "Comment 1")
+        self.assertNotContains(fragment, "Comment 3")
+
+
+class CategoryDirectoryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = User.objects.create_user("seller", password="x")
+        self.toys = Category.objects.create(name="Toys")
+
+    def create_listing(self, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Listing.objects.create(
+                title="Yo-yo", description="Red", author=self.seller, starting_bid=1, **kwargs
+            )
+
+    def test_warm_directory_needs_no_queries(self):
+        self.create_listing(category=self.toys)
+        self.assertEqual(get_category("Toys").active_listings, 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_category("Toys").id, self.toys.id)
+            self.assertIsNone(get_category("Cars"))
+        with self.assertNumQueries(0):
+            self.client.get("/categories/")
+
+    def test_unknown_category_is_404(self):
+        self.assertEqual(self.client.get("/category/Cars/").status_code, 404)
+
+    def test_listing_changes_invalidate_counts(self):
+        listing = self.create_listing(category=self.toys)
+        self.assertEqual(get_category("Toys").active_listings, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            listing.status = Listing.Status.CLOSED
+            listing.save(update_fields=["status"])
+        self.assertEqual(get_category("Toys").active_listings, 0)
+        self.create_listing()
+        with self.captureOnCommitCallbacks(execute=True):
+            Listing.objects.filter(category=None).get().delete()
+        self.assertEqual(get_category("Toys").active_listings, 0)
+
+    def test_other_listing_changes_keep_the_directory(self):
+        listing = self.create_listing(category=self.toys)
+        listing = Listing.objects.get(pk=listing.pk)
+        with mock.patch("auctions.models.forget_category_directory") as forget:
+            listing.title = "Kendama"
+            listing.save()
+            listing.generate_image_variants()
+            listing.category = None
+            listing.save()
+        self.assertEqual(forget.call_count, 1)
+
+
+@override_settings(SESSION_ENGINE="django.contrib.sessions.backends.cached_db")
+class SessionStorageTests(TestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user("seller", password="x")
+        self.alice = User.objects.create_user("alice", password="x")
+        self.listing = Listing.objects.create(
+            title="Bicycle", description="Red", author=self.seller, starting_bid=10
+        )
+
+    def session_queries(self, method, url, data=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, data)
+        return response, [q["sql"] for q in queries if "django_session" in q["sql"]]
+
+    def test_page_views_skip_the_session_table(self):
+        self.client.force_login(self.alice)
+        _, queries = self.session_queries("get", "/")
+        self.assertEqual(queries, [])
+        response, _ = self.session_queries("get", "/logout/")
+        self.assertIn("messages", response.cookies)
+        _, queries = self.session_queries("get", "/")
+        self.assertEqual(queries, [])
+
+    def test_detail_page_reads_the_session_from_the_cache(self):
+        self.client.force_login(self.alice)
+        _, queries = self.session_queries("get", f"/listing/{self.listing.pk}/")
+        self.assertEqual(queries, [])
+
+    @override_settings(SESSION_ENGINE="django.contrib.sessions.backends.db")
+    def test_detail_page_reads_the_session_from_the_db_store(self):
+        self.client.force_login(self.alice)
+        _, queries = self.session_queries("get", f"/listing/{self.listing.pk}/")
+        self.assertEqual(len(queries), 1)
+
+    def test_post_with_message_writes_session_at_most_once(self):
+        self.client.force_login(self.alice)
+        response, queries = self.session_queries(
+            "post", f"/listing/{self.listing.pk}/", {"submit_bid": "1", "price": "12"}
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertIn("messages", response.cookies)
+        self.assertLessEqual(len(queries), 1)
+
+
+class ListingTransferTests(TestCase):
+    def test_export_import_round_trip(self):
+        seller = User.objects.create_user("seller", password="x")
+        alice = User.objects.create_user("alice", password="x")
+        category = Category.objects.create(name="Bikes")
+        listing = Listing.objects.create(
+            title="Bicycle", description="Red, \"fast\"\nbike", author=seller, starting_bid=10, category=category
+        )
+        place_bid(listing, alice, 12)
+        Comment.objects.create(listing=listing, author=alice, content="Still available?")
+
+        for fmt in ("jsonl", "csv"):
+            with self.subTest(fmt=fmt), tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, f"listings.{fmt}")
+                call_command("export_listings", path, stdout=StringIO())
+                call_command("import_listings", path, stdout=StringIO())
+                copy = Listing.objects.exclude(pk=listing.pk).get(title="Bicycle")
+                self.assertEqual(copy.description, listing.description)
+                self.assertEqual(copy.date_posted, listing.date_posted)
+                self.assertEqual((copy.category, copy.current_bidder, copy.current_price), (category, alice, 12))
+                self.assertEqual(copy.comments.get().content, "Still available?")
+                copy.delete()
+
+    def test_malformed_input_names_the_record(self):
+        User.objects.create_user("seller", password="x")
+        valid = {"title": "Lamp", "author": "seller", "starting_bid": "5"}
+        files = {
+            "jsonl": f"{json.dumps(valid)}\n\n{{\"title\": \"Kettle\",\n",
+            "csv": f"title,author,starting_bid,bids\nLamp,seller,5,[]\nKettle,seller,5,[{{\n",
+        }
+        for fmt, content in files.items():
+            with self.subTest(fmt=fmt), tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, f"listings.{fmt}")
+                with open(path, "w") as f:
+                    f.write(content)
+                with self.assertRaisesMessage(CommandError, "Record 2 (line 3)"):
+                    call_command("import_listings", path, stdout=StringIO())
+        self.assertFalse(Listing.objects.exists())
+
+
+class ContentAddressedStorageTests(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        settings_override = override_settings(MEDIA_ROOT=self.root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.seller = User.objects.create_user("seller", password="x")
+        buffer = BytesIO()
+        Image.new("RGB", (40, 30), "red").save(buffer, "PNG")
+        self.png = buffer.getvalue()
+
+    def files(self):
+        return sorted(
+            os.path.relpath(os.path.join(path, name), self.root)
+            for path, _, names in os.walk(self.root) for name in names
+        )
+
+    def test_identical_uploads_are_stored_once_and_deleted_with_their_last_listing(self):
+        listings = []
+        for upload in ("photo.PNG", "copy.png"):
+            listing = Listing(title=upload, description="", author=self.seller, starting_bid=1)
+            listing.image.save(upload, ContentFile(self.png), save=False)
+            listing.save()
+            listing.generate_image_variants()
+            listings.append(listing)
+
+        name = listings[0].image.name
+        self.assertEqual(listings[1].image.name, name)
+        digest = hashlib.sha256(self.png).hexdigest()
+        self.assertEqual(name, f"listing_images/{digest[:2]}/{digest[2:4]}/{digest}.png")
+        self.assertEqual(len(self.files()), 5)  # the original and its four variants
+
+        with self.captureOnCommitCallbacks(execute=True):
+            listings[0].delete()
+        self.assertEqual(len(self.files()), 5)
+        with self.captureOnCommitCallbacks(execute=True):
+            listings[1].delete()
+        self.assertEqual(self.files(), [])
+
+    def test_upload_reusing_a_file_released_before_it_commits_stores_it_again(self):
+        first = Listing(title="Lamp", description="", author=self.seller, starting_bid=1)
+        first.image.save("lamp.png", ContentFile(self.png), save=False)
+        first.save()
+        save = ContentAddressedStorage._save
+
+        def save_then_release(storage, name, content):
+            # The first listing goes away between storing the upload and inserting its listing.
+            stored = save(storage, name, content)
+            Listing.objects.filter(pk=first.pk).delete()
+            self.assertIs(release_image(storage, stored), True)
+            return stored
+
+        second = Listing(
+            title="Copy", description="", author=self.seller, starting_bid=1, image=ContentFile(self.png, "copy.png")
+        )
+        with mock.patch.object(ContentAddressedStorage, "_save", save_then_release):
+            second.save()
+        self.assertEqual(second.image.name, first.image.name)
+        self.assertEqual(self.files(), [second.image.name])
+        self.assertIs(release_image(second.image.storage, second.image.name), False)
+
+    def test_pages_link_the_original_until_variants_exist(self):
+        listing = Listing(title="Lamp", description="", author=self.seller, starting_bid=1)
+        listing.image.save("lamp.png", ContentFile(self.png), save=False)
+        listing.save()
+        self.assertEqual(listing.card_image_url, listing.image.url)
+        self.assertIsNone(listing.card_webp_url)
+        self.client.force_login(self.seller)
+        self.assertNotContains(self.client.get(f"/listing/{listing.pk}/"), "image/webp")
+
+        listing.generate_image_variants()
+        self.assertTrue(Listing.objects.get(pk=listing.pk).image_variants)
+        self.assertTrue(listing.card_image_url.endswith("_260w.png"))
+        self.assertContains(self.client.get(f"/listing/{listing.pk}/"), listing.detail_webp_url)
+
+    def test_generate_image_variants_command_records_them_in_one_update(self):
+        for i in range(3):
+            listing = Listing(title=f"Lamp {i}", description="", author=self.seller, starting_bid=1)
+            image = Image.new("RGB", (40, 30), (i, 0, 0))
+            buffer = BytesIO()
+            image.save(buffer, "PNG")
+            listing.image.save("lamp.png", ContentFile(buffer.getvalue()), save=False)
+            listing.save()
+        versions = dict(Listing.objects.values_list("pk", "version"))
+
+        out = StringIO()
+        with self.assertNumQueries(2):  # the listings, one UPDATE
+            call_command("generate_image_variants", stdout=out)
+        self.assertIn("Wrote 12 image variant(s).", out.getvalue())
+        for pk, variants, version in Listing.objects.values_list("pk", "image_variants", "version"):
+            self.assertEqual((variants, version), (True, versions[pk] + 1))
+
+        with self.assertNumQueries(1):
+            call_command("generate_image_variants", stdout=StringIO())
+
+    def test_deduplicate_images_moves_existing_files(self):
+        for upload in ("a.png", "b.png"):
+            FileSystemStorage(location=self.root).save(f"listing_images/{upload}", ContentFile(self.png))
+            Listing.objects.create(
+                title=upload, description="", author=self.seller, starting_bid=1, image=f"listing_images/{upload}"
+            )
+        Listing.objects.get(title="a.png").generate_image_variants()
+
+        call_command("deduplicate_images", stdout=StringIO())
+
+        names = set(Listing.objects.values_list("image", flat=True))
+        self.assertEqual(len(names), 1)
+        name = names.pop()
+        self.assertTrue(is_addressed(name))
+        self.assertEqual(self.files(), sorted([name, *variant_names(name)]))
+
+
+@override_settings(LISTING_IMAGE_MAX_DIMENSION=500)
+class ListingImageUploadTests(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        settings_override = override_settings(MEDIA_ROOT=self.root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.seller = User.objects.create_user("seller", password="x")
+        self.client.force_login(self.seller)
+
+    def encode(self, image, fmt, **params):
+        buffer = BytesIO()
+        image.save(buffer, fmt, **params)
+        return buffer.getvalue()
+
+    def post(self, name, data):
+        upload = SimpleUploadedFile(name, data)
+        return self.client.post(
+            reverse("create"), {"title": "Lamp", "description": "Desk lamp", "starting_bid": 5, "image": upload}
+        )
+
+    def test_upload_is_rotated_resized_and_stripped(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6  # orientation: rotate 90 degrees clockwise to display
+        exif[0x010F] = "PhoneMaker"
+        photo = self.encode(Image.new("RGB", (3000, 1000), "blue"), "JPEG", exif=exif)
+
+        response = self.post("IMG_0001.JPG", photo)
+
+        self.assertEqual(response.status_code, 302)
+        listing = Listing.objects.get(title="Lamp")
+        self.assertTrue(listing.image.name.endswith(".jpg"))
+        with listing.image.open("rb"), Image.open(listing.image) as stored:
+            self.assertEqual(stored.size, (167, 500))
+            self.assertEqual(dict(stored.getexif()), {})
+
+    def test_rejected_uploads(self):
+        cases = [
+            ("too large", {"LISTING_IMAGE_MAX_UPLOAD_SIZE": 1000}, self.encode(Image.effect_noise((64, 64), 50), "PNG")),
+            ("not an image", {}, b"<?php system($_GET['c']); ?>" * 10),
+            ("decompression bomb", {"LISTING_IMAGE_MAX_PIXELS": 1_000_000}, self.encode(Image.new("1", (5000, 5000)), "PNG")),
+        ]
+        for case, limits, data in cases:
+            with self.subTest(case), override_settings(**limits):
+                response = self.post("upload.png", data)
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response.context["form"].errors["image"])
+        self.assertFalse(Listing.objects.exists())
+        self.assertEqual(os.listdir(self.root), [])
+
+    def test_only_the_new_listing_page_checks_uploads(self):
+        request = RequestFactory().post("/", {"file": SimpleUploadedFile("notes.txt", b"not an image" * 10)})
+        self.assertNotIsInstance(request.FILES["file"], RejectedUpload)
+
+    def test_new_listing_page_still_checks_csrf(self):
+        client = self.client_class(enforce_csrf_checks=True)
+        client.force_login(self.seller)
+        self.assertEqual(client.post(reverse("create"), {"title": "Lamp"}).status_code, 403)
+
+
+@override_settings(DATABASE_REPLICAS=["replica"])
+class ReplicaRoutingTests(SimpleTestCase):
+    def route(self, request, view):
+        """Run view inside ReplicaRoutingMiddleware, returning its result and the response."""
+        seen = []
+        middleware = ReplicaRoutingMiddleware(lambda request: seen.append(view()) or HttpResponse())
+        response = middleware(request)
+        return seen[0], response
+
+    def test_reads_go_to_replica_during_requests_only(self):
+        router = ReplicaRouter()
+        self.assertEqual(router.db_for_read(Listing), "default")
+        alias, response = self.route(RequestFactory().get("/"), lambda: router.db_for_read(Listing))
+        self.assertEqual(alias, "replica")
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_primary_after_write(self):
+        router = ReplicaRouter()
+
+        def view():
+            router.db_for_write(Listing)
+            return router.db_for_read(Listing)
+
+        alias, response = self.route(RequestFactory().get("/"), view)
+        self.assertEqual(alias, "default")
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+        request = RequestFactory().get("/")
+        request.COOKIES[PIN_COOKIE] = "1"
+        alias, _ = self.route(request, lambda: router.db_for_read(Listing))
+        self.assertEqual(alias, "default")
+
+    def test_primary_for_unsafe_methods_and_sessions(self):
+        from django.contrib.sessions.models import Session
+
+        router = ReplicaRouter()
+        alias, _ = self.route(RequestFactory().post("/"), lambda: router.db_for_read(Listing))
+        self.assertEqual(alias, "default")
+        alias, _ = self.route(RequestFactory().get("/"), lambda: router.db_for_read(Session))
+        self.assertEqual(alias, "default")
+
+
+class StaticFilesTests(SimpleTestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.css = b"body { color: red; }\n" * 50
+        storage = CompressedManifestStaticFilesStorage(location=self.root)
+        storage.save("app.0123456789ab.css", ContentFile(self.css))
+        storage.compress("app.0123456789ab.css")
+
+    def get(self, path, accept_encoding="", **headers):
+        with override_settings(STATIC_ROOT=self.root, STATIC_URL="/static/"):
+            middleware = StaticFilesMiddleware(lambda request: HttpResponse(status=404))
+        middleware.hashed = {"app.0123456789ab.css"}
+        response = middleware(RequestFactory().get(path, HTTP_ACCEPT_ENCODING=accept_encoding, **headers))
+        body = b"".join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def test_serves_precompressed_variant(self):
+        response, body = self.get("/static/app.0123456789ab.css", "gzip, deflate")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(body), self.css)
+        self.assertEqual(response["Cache-Control"], "public, max-age=31536000, immutable")
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+        self.assertNotIn("Content-Disposition", response)
+
+        response, body = self.get("/static/app.0123456789ab.css", "gzip;q=0")
+        self.assertNotIn("Content-Encoding", response)
+        self.assertEqual(body, self.css)
+
+    def test_conditional_requests_keep_the_etag(self):
+        response, _ = self.get("/static/app.0123456789ab.css", "gzip")
+        etag = response["ETag"]
+        for headers in ({"HTTP_IF_NONE_MATCH": etag}, {"HTTP_IF_MODIFIED_SINCE": response["Last-Modified"]}):
+            with self.subTest(headers):
+                response, _ = self.get("/static/app.0123456789ab.css", **headers)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response["ETag"], etag)
+        response, _ = self.get("/static/app.0123456789ab.css", HTTP_IF_NONE_MATCH='"other"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_collectstatic_writes_compressed_copies_of_hashed_files(self):
+        source = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, source)
+        with open(os.path.join(source, "app.css"), "wb") as f:
+            f.write(self.css)
+        with open(os.path.join(source, "tiny.css"), "wb") as f:
+            f.write(b"a{}")
+        root = os.path.join(self.root, "collected")
+        storages = {
+            **settings.STORAGES,
+            "staticfiles": {"BACKEND": "commerce.staticfiles.CompressedManifestStaticFilesStorage"},
+        }
+        with override_settings(
+            STATIC_ROOT=root,
+            STATICFILES_DIRS=[source],
+            STATICFILES_FINDERS=["django.contrib.staticfiles.finders.FileSystemFinder"],
+            STORAGES=storages,
+        ):
+            call_command("collectstatic", interactive=False, verbosity=0)
+            hashed = CompressedManifestStaticFilesStorage(location=root).hashed_files
+
+        app = os.path.join(root, hashed["app.css"])
+        with gzip.open(app + ".gz") as f:
+            self.assertEqual(f.read(), self.css)
+        self.assertEqual(os.path.exists(app + ".br"), staticfiles.brotli is not None)
+        self.assertFalse(os.path.exists(os.path.join(root, hashed["tiny.css"]) + ".gz"))
+
+    def test_missing_and_outside_files_fall_through(self):
+        self.assertEqual(self.get("/static/missing.css")[0].status_code, 404)
+        self.assertEqual(self.get("/static/../etc/passwd")[0].status_code, 404)
+
+
+class MediaServingTests(SimpleTestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        os.makedirs(os.path.join(self.root, "listing_images"))
+        self.data = bytes(range(256)) * 40
+        with open(os.path.join(self.root, "listing_images", "photo.jpg"), "wb") as f:
+            f.write(self.data)
+
+    def get(self, path="listing_images/photo.jpg", **headers):
+        with override_settings(MEDIA_ROOT=self.root, MEDIA_ACCEL_REDIRECT=None):
+            response = serve_media(RequestFactory().get("/media/" + path, **headers), path)
+        body = b"".join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def test_full_and_ranged_responses(self):
+        response, body = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, self.data)
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertEqual(response["Cache-Control"], "public, max-age=604800")
+
+        response, body = self.get(HTTP_RANGE="bytes=100-199")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(body, self.data[100:200])
+        self.assertEqual(response["Content-Length"], "100")
+        self.assertEqual(response["Content-Range"], f"bytes 100-199/{len(self.data)}")
+
+        response, body = self.get(HTTP_RANGE="bytes=-10")
+        self.assertEqual(body, self.data[-10:])
+
+        response, _ = self.get(HTTP_RANGE=f"bytes={len(self.data)}-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], f"bytes */{len(self.data)}")
+
+        # A stale If-Range validator gets the whole, current file.
+        response, body = self.get(HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, self.data)
+
+    def test_conditional_requests(self):
+        response, _ = self.get()
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=response["ETag"])[0].status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])[0].status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH='"other"')[0].status_code, 200)
+
+    def test_missing_and_outside_files(self):
+        for path in ("listing_images/missing.jpg", "listing_images", "../etc/passwd"):
+            with self.subTest(path=path), self.assertRaises(Http404):
+                self.get(path)
+
+    def test_accel_redirect_hands_the_file_to_the_proxy(self):
+        with override_settings(MEDIA_ROOT=self.root, MEDIA_ACCEL_REDIRECT="/protected-media/"):
+            response = serve_media(RequestFactory().get("/media/listing_images/photo.jpg"), "listing_images/photo.jpg")
+        self.assertEqual(response["X-Accel-Redirect"], "/protected-media/listing_images/photo.jpg")
+        self.assertEqual(response.content, b"")
+
+
+@override_settings(MIDDLEWARE=["commerce.middleware.PerformanceMiddleware", *settings.MIDDLEWARE])
+class PerformanceMiddlewareTests(TestCase):
+    def setUp(self):
+        seller = User.objects.create_user("seller", password="x")
+        Listing.objects.create(title="Lamp", description="", author=seller, starting_bid=5)
+        cache.clear()
+
+    def assert_timed(self, response):
+        timings = dict(re.findall(r"(\w+);dur=([\d.]+)", response["Server-Timing"]))
+        self.assertEqual(list(timings), ["sql", "tpl", "app", "total"])
+        self.assertGreater(float(timings["tpl"]), 0)
+        self.assertRegex(response["Server-Timing"], r'sql;dur=[\d.]+;desc="[1-9]\d* queries"')
+
+    @override_settings(PERF_SLOW_REQUEST_MS=0)
+    def test_server_timing_and_slow_request_log(self):
+        with self.assertLogs("commerce.performance", "WARNING") as logs:
+            response = self.client.get("/")
+        self.assert_timed(response)
+        (line,) = logs.output
+        report = json.loads(line.split("Slow request ", 1)[1])
+        self.assertEqual((report["method"], report["path"], report["status"]), ("GET", "/", 200))
+        self.assertGreater(report["sql_count"], 0)
+        self.assertTrue(report["slowest_sql"])
+
+    @override_settings(PERF_SLOW_REQUEST_MS=60_000)
+    def test_fast_requests_are_not_logged(self):
+        with self.assertNoLogs("commerce.performance"):
+            self.assert_timed(self.client.get("/"))
+
+    @override_settings(PERF_SLOW_REQUEST_MS=60_000, ROOT_URLCONF="commerce.urls_async")
+    async def test_async_requests_are_timed(self):
+        self.assert_timed(await self.async_client.get("/"))
+
+
+class AuctionSchedulerTests(TestCase):
+    def test_tick_closes_expired_listings_with_their_top_bidder(self):
+        seller = User.objects.create_user("seller", password="x")
+        buyer = User.objects.create_user("buyer", password="x")
+        now = timezone.now()
+        expired = Listing.objects.create(
+            title="Old", description="", author=seller, starting_bid=1, ends_at=now + timedelta(seconds=5)
+        )
+        running = Listing.objects.create(
+            title="New", description="", author=seller, starting_bid=1, ends_at=now + timedelta(hours=1)
+        )
+        place_bid(expired, buyer, 5)
+
+        scheduler = AuctionScheduler()
+        self.assertEqual(scheduler.tick(now), 0)
+        self.assertEqual(scheduler.tick(now + timedelta(seconds=10)), 1)
+
+        expired.refresh_from_db()
+        running.refresh_from_db()
+        self.assertEqual(expired.status, Listing.Status.CLOSED)
+        self.assertEqual(expired.winner, buyer)
+        self.assertEqual(running.status, Listing.Status.ACTIVE)
+        self.assertEqual(place_bid(expired, seller, 50).status, BidStatus.REJECTED)
+
+
+    def test_refresh_does_not_skip_listings_created_while_it_loads(self):
+        seller = User.objects.create_user("seller", password="x")
+        now = timezone.now()
+        scheduler = AuctionScheduler()
+        scheduler.refresh(now)
+
+        late = []
+        load = QuerySet.iterator
+
+        def iterator(queryset, *args, **kwargs):
+            yield from load(queryset, *args, **kwargs)
+            if not late:
+                late.append(Listing.objects.create(
+                    title="Late", description="", author=seller, starting_bid=1, ends_at=now + timedelta(seconds=5)
+                ))
+
+        with mock.patch.object(QuerySet, "iterator", iterator):
+            scheduler.refresh(now + timedelta(seconds=30))
+        self.assertEqual(scheduler.tick(now + timedelta(minutes=1)), 1)
+        late[0].refresh_from_db()
+        self.assertEqual(late[0].status, Listing.Status.CLOSED)
+
+
+class PlaceBidStressTests(TransactionTestCase):
+    THREADS = 8
+    BIDS_PER_THREAD = 50
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # The in-memory test database is shared between threads through table
+        # locks, real SQLite locking needs a file. Copy the migrated schema
+        # into one and run this class against it with the production profile.
+        cls.directory = tempfile.mkdtemp()
+        path = os.path.join(cls.directory, "stress.sqlite3")
+        cls.memory = connections[DEFAULT_DB_ALIAS]
+        cls.memory.ensure_connection()
+        with closing(sqlite3.connect(path)) as target:
+            cls.memory.connection.backup(target)
+        cls.file_settings = mock.patch.dict(
+            connections.settings[DEFAULT_DB_ALIAS], {**settings.SQLITE_PRODUCTION_PROFILE, "NAME": path}
+        )
+        cls.file_settings.start()
+        connections[DEFAULT_DB_ALIAS] = connections.create_connection(DEFAULT_DB_ALIAS)
+
+    @classmethod
+    def tearDownClass(cls):
+        connections[DEFAULT_DB_ALIAS].close()
+        cls.file_settings.stop()
+        connections[DEFAULT_DB_ALIAS] = cls.memory
+        shutil.rmtree(cls.directory)
+        super().tearDownClass()
+
+    def test_concurrent_bidding_loses_and_reorders_nothing(self):
+        seller = User.objects.create_user("seller", password="x")
+        bidders = [User.objects.create_user(f"bidder{i}", password="x") for i in range(self.THREADS)]
+        listing = Listing.objects.create(title="Hot item", description="", author=seller, starting_bid=1)
+        accepted = []
+        errors = []
+        lock = threading.Lock()
+
+        def bid_war(user, offset):
+            try:
+                for n in range(self.BIDS_PER_THREAD):
+                    snapshot = Listing.objects.get(pk=listing.pk)
+                    amount = (snapshot.current_price or 1) + 1 + offset
+                    result = place_bid(snapshot, user, amount)
+                    if result.accepted:
+                        with lock:
+                            accepted.append(result.bid)
+            except Exception as e:  # surfaced in the main thread below
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=bid_war, args=(u, i / 100)) for i, u in enumerate(bidders)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(errors, [])
+        listing.refresh_from_db()
+        stored = list(Bid.objects.filter(listing=listing).order_by("id"))
+        prices = [b.price for b in stored]
+
+        # Nothing lost: every accepted bid is stored and counted, nothing else is.
+        self.assertEqual(sorted(b.pk for b in accepted), [b.pk for b in stored])
+        self.assertEqual(listing.bid_count, len(stored))
+        # Nothing out of order: insertion order is strictly increasing in price.
+        self.assertEqual(prices, sorted(set(prices)))
+        self.assertEqual(listing.current_price, prices[-1])
+        self.assertEqual(listing.current_bidder_id, stored[-1].bidder_id)
+
+
+class SeedMarketplaceTests(TestCase):
+    def test_seeded_rows_and_summaries_agree(self):
+        call_command("seed_marketplace", listings=20, users=10, categories=3, stdout=StringIO())
+        self.assertEqual((Listing.objects.count(), User.objects.count(), Category.objects.count()), (20, 10, 3))
+        self.assertTrue(Bid.objects.exists())
+        for listing in Listing.objects.prefetch_related("bids", "comments", "watchers"):
+            with self.subTest(listing=listing.pk):
+                bids = sorted(listing.bids.all(), key=lambda bid: bid.price)
+                top = bids[-1] if bids else None
+                self.assertEqual(listing.bid_count, len(bids))
+                self.assertEqual(listing.current_price, top and top.price)
+                self.assertEqual(listing.current_bidder_id, top and top.bidder_id)
+                self.assertNotIn(listing.author_id, [bid.bidder_id for bid in bids])
+                self.assertEqual(listing.comment_count, len(listing.comments.all()))
+                self.assertEqual(listing.watcher_count, len(listing.watchers.all()))
+                if listing.status == Listing.Status.CLOSED:
+                    self.assertEqual(listing.winner_id, listing.current_bidder_id)
+
+
+class BenchmarkViewsTests(TransactionTestCase):
+    def test_reports_every_view_at_each_size(self):
+        out = StringIO()
+        call_command("benchmark_views", sizes="5", requests=2, warmup=0, stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual((report["requests"], report["instrumented"], list(report["sizes"])), (2, False, ["5"]))
+        views = report["sizes"]["5"]
+        self.assertIn("index", views)
+        self.assertNotIn("logout", views)
+        for name, row in views.items():
+            with self.subTest(name):
+                self.assertEqual(set(row), {"url", "status", "p50_ms", "p95_ms", "queries", "bytes"})
+                self.assertLessEqual(row["p50_ms"], row["p95_ms"])
+        self.assertEqual(views["index"]["status"], 200)
+        self.assertGreater(views["index"]["queries"], 0)
+
+
+class QueryPlanTests(TestCase):
+    """Every query the views run against the hot tables must be index-assisted."""
+
+    HOT_TABLES = ("auctions_listing", "auctions_bid", "auctions_comment", "auctions_listing_watchers")
+    FULL_SCAN = re.compile(r"^SCAN (\w+)$")
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user("seller", password="x")
+        cls.buyer = User.objects.create_user("buyer", password="x")
+        cls.category = Category.objects.create(name="Toys")
+        for i in range(30):
+            listing = Listing.objects.create(
+                title=f"Item {i}",
+                description="Lorem ipsum",
+                author=cls.seller,
+                starting_bid=1,
+                category=cls.category,
+                status=Listing.Status.CLOSED if i % 3 == 0 else Listing.Status.ACTIVE,
+            )
+            Bid.objects.create(price=2 + i, bidder=cls.buyer, listing=listing)
+            Comment.objects.create(content="Nice", author=cls.buyer, listing=listing)
+            listing.watchers.add(cls.buyer)
+        cls.listing = listing
+
+    def setUp(self):
+        # Category ids cached by other tests' directories would not match.
+        cache.clear()
+
+    def full_scans(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+            details = [row[-1] for row in cursor.fetchall()]
+        return [
+            detail for detail in details
+            if (match := self.FULL_SCAN.match(detail)) and match.group(1) in self.HOT_TABLES
+        ]
+
+    def assertNoFullScans(self, user, url):
+        self.client.force_login(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        for query in queries:
+            if query["sql"].startswith("SELECT"):
+                self.assertEqual(self.full_scans(query["sql"]), [], f"{url}: {query['sql']}")
+
+    def test_views_use_indexes(self):
+        for user, url in [
+            (self.buyer, "/"),
+            (self.buyer, "/category/Toys/"),
+            (self.buyer, "/watchlist/"),
+            (self.buyer, "/won/"),
+            (self.seller, "/closed/"),
+            (self.seller, "/my-listings/"),
+            (self.buyer, "/search/?q=item"),
+            (self.buyer, f"/listing/{self.listing.id}/"),
+            (self.buyer, f"/listing/{self.listing.id}/comments/"),
+        ]:
+            with self.subTest(url=url):
+                self.assertNoFullScans(user, url)
+
+    def test_bid_summary_rebuild_uses_indexes(self):
+        with CaptureQueriesContext(connection) as queries:
+            Listing.objects.filter(pk=self.listing.pk).refresh_bid_summaries()
+        self.assertEqual(self.full_scans(queries[0]["sql"]), [])
@@ -0,0 +1,168 @@
+"""
+Streaming import and export of listings with their bids and comments.
+
+One record per listing, as JSON lines or CSV. Users, categories and the
+winner are referenced by name and bids/comments are nested in the record;
+in CSV the nested lists are JSON-encoded into their column. Records are
+read and written one at a time, so memory use does not grow with the file.
+"""
+import csv
+import json
+import os
+import sys
+from contextlib import contextmanager
+from datetime import datetime
+from decimal import Decimal
+from itertools import count
+from typing import Iterable, Iterator
+
+from django.core.files import File
+from django.utils.dateparse import parse_datetime
+
+from .images import VARIANT_WIDTHS, save_variant, variant_name
+
+FORMATS = ("jsonl", "csv")
+
+FIELDS = (
+    "id", "title", "description", "starting_bid", "image", "category", "author",
+    "date_posted", "status", "winner", "ends_at", "bids", "comments",
+)
+NESTED_FIELDS = ("bids", "comments")
+
+# Long descriptions and nested bid lists can exceed csv's 128 KiB default.
+csv.field_size_limit(sys.maxsize)
+
+
+def detect_format(path: str, fmt: str | None = None) -> str:
+    """The explicit fmt, else the format implied by the file extension."""
+    fmt = fmt or os.path.splitext(path)[1].lstrip(".").lower()
+    if fmt == "json":
+        fmt = "jsonl"
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format {fmt!r}, expected one of {', '.join(FORMATS)}.")
+    return fmt
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def read_records(f, fmt: str) -> Iterator[dict]:
+    """
+    Yield the listing records of an open text file one by one. Malformed
+    input raises ValueError naming the record and its line.
+    """
+    if fmt == "jsonl":
+        number = 0
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            number += 1
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Record {number} (line {line_number}): {e}") from e
+            yield record
+        return
+
+    reader = csv.DictReader(f)
+    for number in count(1):
+        try:
+            record = next(reader, None)
+            if record is None:
+                return
+            for field in NESTED_FIELDS:
+                record[field] = json.loads(record.get(field) or "[]")
+        except (csv.Error, json.JSONDecodeError) as e:
+            # line_num is where reading stopped, the last line of a multi-line row.
+            raise ValueError(f"Record {number} (line {reader.line_num}): {e}") from e
+        # CSV has no null, blank optional columns mean "not set".
+        yield {key: value if value != "" else None for key, value in record.items()}
+
+
+def write_records(f, records: Iterable[dict], fmt: str) -> int:
+    """Write records to an open text file, returns how many were written."""
+    count = 0
+    if fmt == "jsonl":
+        for record in records:
+            f.write(json.dumps(record, default=_json_default, ensure_ascii=False))
+            f.write("\n")
+            count += 1
+        return count
+
+    writer = csv.DictWriter(f, fieldnames=FIELDS)
+    writer.writeheader()
+    for record in records:
+        row = {
+            key: "" if value is None else value.isoformat() if isinstance(value, datetime) else value
+            for key, value in record.items()
+        }
+        for field in NESTED_FIELDS:
+            row[field] = json.dumps(record[field], default=_json_default, ensure_ascii=False)
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+def parse_timestamp(value) -> datetime | None:
+    if value in (None, ""):
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError(f"Invalid timestamp {value!r}.")
+    return parsed
+
+
+@contextmanager
+def keep_auto_now_add(*models):
+    """
+    Let bulk_create() store the date_posted values it is given.
+
+    auto_now_add fields overwrite whatever is set on insert, which would stamp
+    every imported row with the time of the import.
+    """
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, "auto_now_add", False)
+    ]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def copy_image(name: str, source_dir, storage) -> str | None:
+    """
+    Copy the image name, relative to source_dir, and any resized variants
+    generated next to it into storage. Returns the stored name, or None when
+    the source file is missing. Files already in place are not copied again.
+    """
+    source = os.path.join(source_dir, name)
+    if not os.path.isfile(source):
+        return None
+    try:
+        if os.path.samefile(source, storage.path(name)):
+            return name
+    except (FileNotFoundError, NotImplementedError):
+        pass
+
+    with open(source, "rb") as f:
+        stored = storage.save(name, File(f, name=os.path.basename(name)))
+    for width in VARIANT_WIDTHS:
+        for ext in (None, ".webp"):
+            variant = os.path.join(source_dir, variant_name(name, width, ext))
+            if not os.path.isfile(variant):
+                continue
+            target = variant_name(stored, width, ext)
+            if storage.exists(target):
+                storage.delete(target)
+            with open(variant, "rb") as f:
+                save_variant(storage, target, File(f, name=os.path.basename(target)))
+    return stored
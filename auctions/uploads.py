@@ -0,0 +1,83 @@
+"""
+Checks on uploaded files made while the request body streams in.
+
+The new-listing view installs ImageUploadHandler ahead of the default
+FILE_UPLOAD_HANDLERS, other uploads are left alone. It counts the bytes
+of every uploaded file and looks at its first bytes; once a file is over
+LISTING_IMAGE_MAX_UPLOAD_SIZE or does not start like a JPEG, PNG or WebP
+image, the rest of it is discarded instead of being passed on to the
+memory or temporary-file handlers. The file then arrives in request.FILES
+as an empty RejectedUpload carrying the reason, which ListingImageField
+reports as a form error. Accepted files are stored by the next handler and
+normalised by images.normalise_upload() when the form is cleaned.
+"""
+from io import BytesIO
+
+from django import forms
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from django.template.defaultfilters import filesizeformat
+
+from .images import normalise_upload
+
+DEFAULT_MAX_UPLOAD_SIZE = 20 * 1024 * 1024
+
+SIGNATURE_LENGTH = 12
+
+
+def is_image_signature(head: bytes) -> bool:
+    return (
+        head.startswith(b"\xff\xd8\xff")  # JPEG
+        or head.startswith(b"\x89PNG\r\n\x1a\n")
+        or (head[:4] == b"RIFF" and head[8:12] == b"WEBP")
+    )
+
+
+class RejectedUpload(UploadedFile):
+    """Stands in for a file ImageUploadHandler refused, holding none of its content."""
+
+    def __init__(self, name, content_type, error: str):
+        super().__init__(BytesIO(), name=name, content_type=content_type, size=0)
+        self.error = error
+
+
+class ImageUploadHandler(FileUploadHandler):
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.max_size = getattr(settings, "LISTING_IMAGE_MAX_UPLOAD_SIZE", DEFAULT_MAX_UPLOAD_SIZE)
+        self.received = 0
+        self.head = b""
+        self.error = None
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.error:
+            return None
+        self.received += len(raw_data)
+        if len(self.head) < SIGNATURE_LENGTH:
+            self.head += raw_data[: SIGNATURE_LENGTH - len(self.head)]
+            if len(self.head) == SIGNATURE_LENGTH and not is_image_signature(self.head):
+                self.error = "Upload a JPEG, PNG or WebP image."
+        if self.received > self.max_size:
+            self.error = f"The image is larger than {filesizeformat(self.max_size)}."
+        # Returning None keeps the chunk from the handlers after this one.
+        return None if self.error else raw_data
+
+    def file_complete(self, file_size):
+        if not self.error and self.received and not is_image_signature(self.head):
+            self.error = "Upload a JPEG, PNG or WebP image."
+        if self.error:
+            return RejectedUpload(self.file_name, self.content_type, self.error)
+        return None
+
+
+class ListingImageField(forms.ImageField):
+    """ImageField that reports RejectedUpload reasons and stores normalised images."""
+
+    def to_python(self, data):
+        if isinstance(data, RejectedUpload):
+            raise forms.ValidationError(data.error, code="rejected_upload")
+        image = super().to_python(data)
+        if image is None:
+            return None
+        return normalise_upload(image)
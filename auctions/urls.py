@@ -1,6 +1,6 @@
 from django.urls import path
 
-from . import views
+from . import api, views
 
 urlpatterns = [
     path("", views.index, name="index"),
@@ -12,9 +12,17 @@ urlpatterns = [
     path("register/", views.register, name="register"),
     path("categories/", views.list_categories, name="list_categories"),
     path("category/<str:category>/", views.category, name="category"),
+    path("search/", views.search, name="search"),
+    path("search/json/", views.search_json, name="search_json"),
     path("watchlist/", views.watchlist, name="watchlist"),
     path("create/", views.create, name="create"),
     path("listing/<int:id>/", views.listing_detail, name="listing_detail"),
     path('listing/<int:id>/delete/', views.delete_listing, name="delete_listing"),
     path('listing/<int:id>/close/', views.close_listing, name="close_listing"),
+    path("listing/<int:id>/events/", views.listing_events, name="listing_events"),
+    path("listing/<int:id>/comments/", views.listing_comments, name="listing_comments"),
+    path("listing/<int:id>/watch/", views.toggle_watchlist, name="toggle_watchlist"),
+    path("api/v1/listings/", api.listings, name="api_listings"),
+    path("api/v1/listings/<int:id>/", api.listing_detail, name="api_listing_detail"),
+    path("api/v1/categories/", api.categories, name="api_categories"),
 ]
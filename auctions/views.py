@@ -1,46 +1,109 @@
+from django.conf import settings
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db import IntegrityError
-from django.http import HttpResponseRedirect, HttpResponseForbidden
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.http import Http404, HttpResponse, HttpResponseRedirect, HttpResponseForbidden, JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from django.views.decorators.http import require_POST
 
+from . import events
+from .cache import card_cache_timeout, forget_category_directory, forget_listing_card
+from .categories import category_directory, get_category
 from .forms import NewListingForm, NewBidForm, NewCommentForm
-from .models import User, Listing, Category, Comment
+from .models import User, Listing, Comment
+from .pagination import paginate_request
+from .search import search_listings
+from .services import place_bid, toggle_watch
+from .uploads import ImageUploadHandler
 
 
-def index(request):
+def render_listing_grid(request, listings, title):
+    """Render one cursor-paginated page of listing cards with index.html."""
+    page = paginate_request(request, listings.for_cards(request.user))
     return render(request, "auctions/index.html", {
-        "listings": Listing.objects.filter(status=Listing.Status.ACTIVE),
-        "title": "Active Listings",
+        "listings": page,
+        "page": page,
+        "title": title,
+        "card_cache_timeout": card_cache_timeout(),
         })
 
+def index(request):
+    return render_listing_grid(
+        request, Listing.objects.filter(status=Listing.Status.ACTIVE), "Active Listings"
+    )
+
 @login_required 
 def closed_listings(request):
-    return render(request, "auctions/index.html", {
-        "listings": Listing.objects.filter(status=Listing.Status.CLOSED).filter(author=request.user),
-        "title": "My Closed Listings",
-        })
+    return render_listing_grid(
+        request,
+        Listing.objects.filter(status=Listing.Status.CLOSED, author=request.user),
+        "My Closed Listings",
+    )
 
 @login_required 
 def won_listings(request):
-    return render(request, "auctions/index.html", {
-        "listings": Listing.objects.filter(status=Listing.Status.CLOSED).filter(winner=request.user),
-        "title": "My Won Listings",
-        })
+    return render_listing_grid(
+        request,
+        Listing.objects.filter(status=Listing.Status.CLOSED, winner=request.user),
+        "My Won Listings",
+    )
 
 @login_required 
 def my_listings(request):
-    return render(request, "auctions/index.html", {
-        "listings": Listing.objects.filter(status=Listing.Status.ACTIVE).filter(author=request.user),
-        "title": "My Listings",
-        })
+    return render_listing_grid(
+        request,
+        Listing.objects.filter(status=Listing.Status.ACTIVE, author=request.user),
+        "My Listings",
+    )
 
 def category(request, category):
+    entry = get_category(category)
+    if entry is None:
+        raise Http404("No such category.")
+    return render_listing_grid(
+        request,
+        Listing.objects.filter(status=Listing.Status.ACTIVE, category_id=entry.id),
+        entry.name,
+    )
+
+def search(request):
+    query = request.GET.get("q", "").strip()
+    page = search_listings(
+        query, request.user, after=request.GET.get("after"), before=request.GET.get("before")
+    )
     return render(request, "auctions/index.html", {
-        "listings": Listing.objects.filter(status=Listing.Status.ACTIVE).filter(category=Category.objects.get(name=category)),
-        "title": category,
+        "listings": page,
+        "page": page,
+        "title": f'Search results for "{query}"' if query else "Search",
+        "query": query,
+        "card_cache_timeout": card_cache_timeout(),
+        })
+
+def search_json(request):
+    query = request.GET.get("q", "").strip()
+    page = search_listings(
+        query, request.user, after=request.GET.get("after"), before=request.GET.get("before")
+    )
+    return JsonResponse({
+        "query": query,
+        "results": [
+            {
+                "id": listing.id,
+                "title": listing.title,
+                "price": listing.price,
+                "category": listing.category.name if listing.category else None,
+                "seller": listing.author.username,
+                "image": listing.card_image_url,
+                "url": reverse("listing_detail", args=[listing.id]),
+            }
+            for listing in page
+        ],
+        "next": page.next_cursor,
+        "previous": page.previous_cursor,
         })
 
 def login_view(request):
@@ -103,7 +166,7 @@ def register(request):
 
 
 def list_categories(request):
-    return render(request, "auctions/categories.html", {"categories": Category.objects.all()})
+    return render(request, "auctions/categories.html", {"categories": category_directory().values()})
 
 
 @login_required
@@ -112,25 +175,39 @@ def watchlist(request):
 
     if request.method == "POST":
         listing_id = request.POST.get("listing_id")
-        listing = get_object_or_404(Listing, id=listing_id)
+        listing = get_object_or_404(Listing.objects.only("id", "title"), id=listing_id)
 
-        if user in listing.watchers.all():
-            messages.info(request, f"Removed {listing.title} from Watchlist!")
-            listing.watchers.remove(user)
-        else:
+        if toggle_watch(listing, user):
             messages.success(request, f"Added {listing.title} to Watchlist!")
-            listing.watchers.add(user)
+        else:
+            messages.info(request, f"Removed {listing.title} from Watchlist!")
 
         return redirect("listing_detail", id=listing.id)
     
-    return render(request, "auctions/index.html", {
-        "listings": user.watchlist.all(),
-        "title": "My Watchlist",
-        })
+    return render_listing_grid(request, Listing.objects.filter(watchers=user), "My Watchlist")
+
+
+@require_POST
+def toggle_watchlist(request, id):
+    """Toggle the listing on the user's watchlist and return the new state as JSON."""
+    if not request.user.is_authenticated:
+        return JsonResponse({"error": "Log in to use the watchlist."}, status=401)
+    listing = get_object_or_404(Listing.objects.only("id"), id=id)
+    watching = toggle_watch(listing, request.user)
+    watchers = Listing.objects.filter(pk=id).values_list("watcher_count", flat=True).get()
+    return JsonResponse({"watching": watching, "watchers": watchers})
 
 
 @login_required
+@csrf_exempt
 def create(request):
+    # The handler must be in place before request.POST is first read, which
+    # CsrfViewMiddleware would otherwise do, hence the CSRF check in _create().
+    request.upload_handlers.insert(0, ImageUploadHandler(request))
+    return _create(request)
+
+@csrf_protect
+def _create(request):
     if request.method == "POST":
         form = NewListingForm(request.POST, request.FILES)
         if form.is_valid():
@@ -139,6 +216,7 @@ def create(request):
             )  # to manually add the author and then save
             listing.author = request.user
             listing.save()
+            listing.generate_image_variants()
             return HttpResponseRedirect(reverse("index"))
     else:
         form = NewListingForm()
@@ -148,8 +226,8 @@ def create(request):
 
 @login_required
 def listing_detail(request, id):
-    listing = get_object_or_404(Listing, id=id)
-    comments = Comment.objects.filter(listing=listing).order_by("-date_posted")
+    listing = get_object_or_404(Listing.objects.for_detail(request.user), id=id)
+    comments = paginate_request(request, comments_for(id), page_size=settings.COMMENTS_PAGE_SIZE)
 
     bid_form = NewBidForm(user=request.user, listing=listing)
     comment_form = NewCommentForm()
@@ -158,12 +236,11 @@ def listing_detail(request, id):
         if "submit_bid" in request.POST: 
             bid_form = NewBidForm(request.POST, user=request.user, listing=listing)
             if bid_form.is_valid():
-                new_bid = bid_form.save(commit=False)
-                new_bid.bidder = request.user
-                new_bid.listing = listing
-                new_bid.save()
-                messages.success(request, "Bid successful!")     
-                return HttpResponseRedirect(reverse("listing_detail", args=[id]))
+                result = place_bid(listing, request.user, bid_form.cleaned_data["price"])
+                if result.accepted:
+                    messages.success(request, result.message)
+                    return HttpResponseRedirect(reverse("listing_detail", args=[id]))
+                bid_form.add_error("price", result.message)
             
         elif "submit_comment" in request.POST:
             comment_form = NewCommentForm(request.POST)
@@ -189,6 +266,46 @@ def listing_detail(request, id):
         },
     )
 
+def comments_for(listing_id):
+    """A listing's comments with their authors, paginated newest first by paginate()."""
+    return Comment.objects.filter(listing_id=listing_id).select_related("author")
+
+
+@login_required
+def listing_comments(request, id):
+    """
+    The page of comments older than the `after` cursor, as the HTML fragment
+    detail.html appends or, when the client prefers it, as JSON.
+    """
+    if not Listing.objects.filter(pk=id).exists():
+        raise Http404("No such listing.")
+    comments = paginate_request(request, comments_for(id), page_size=settings.COMMENTS_PAGE_SIZE)
+
+    if request.get_preferred_type(["text/html", "application/json"]) == "application/json":
+        return JsonResponse({
+            "results": [
+                {
+                    "id": comment.id,
+                    "author": comment.author.username,
+                    "content": comment.content,
+                    "posted": comment.date_posted.isoformat(),
+                }
+                for comment in comments
+            ],
+            "next": comments.next_cursor,
+        })
+    return render(request, "auctions/comments.html", {"comments": comments, "listing_id": id})
+
+
+def listing_events(request, id):
+    """
+    Live events need commerce.asgi, which routes this URL to
+    async_views.listing_events. Under WSGI the stream would hold a worker
+    thread and never flush, so answer 204, which stops EventSource from
+    reconnecting.
+    """
+    return HttpResponse(status=204)
+
 @login_required
 def delete_listing(request, id):
     listing = get_object_or_404(Listing, id=id)
@@ -197,6 +314,7 @@ def delete_listing(request, id):
         return HttpResponseForbidden("Only the author of a listing can delete it.")
     
     if request.method == "POST":
+        forget_listing_card(listing)
         listing.delete()
         messages.info(request, "Listing was deleted!")
         return HttpResponseRedirect(reverse("index"))
@@ -209,8 +327,20 @@ def close_listing(request, id):
         return HttpResponseForbidden("Only the author of a listing can close it.")
     
     if request.method == "POST":
-        listing.status = 1
-        listing.winner = listing.highest_bidder
-        listing.save()
+        with transaction.atomic():
+            # Conditional, like scheduler.close_expired(): the winner is the top
+            # bidder when the row is written, not when it was loaded above, and
+            # closing twice publishes once.
+            closed = Listing.objects.filter(pk=listing.pk, status=Listing.Status.ACTIVE).update(
+                status=Listing.Status.CLOSED,
+                winner=F("current_bidder"),
+                version=F("version") + 1,
+            )
+            if closed:
+                events.publish(listing.id, "closed")
+        if not closed:
+            messages.info(request, "Listing was already closed.")
+            return HttpResponseRedirect(reverse("listing_detail", args=[listing.id]))
+        forget_category_directory()
         messages.info(request, "Listing was closed!")
         return HttpResponseRedirect(reverse("index"))
\ No newline at end of file
@@ -3,14 +3,34 @@ ASGI config for commerce project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve it with an ASGI server (e.g. ``uvicorn commerce.asgi:application``) to
+get the live listing event streams, which hold idle connections as suspended
+coroutines instead of worker threads. Requests served here resolve against
+``commerce.urls_async``, so the async versions of the read views are used.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/3.0/howto/deployment/asgi/
 """
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+from django.core.handlers.asgi import ASGIHandler
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "commerce.settings")
 
-application = get_asgi_application()
+ASYNC_URLCONF = "commerce.urls_async"
+
+
+class CommerceASGIHandler(ASGIHandler):
+    """ASGIHandler that routes every request through the async URLconf."""
+
+    def create_request(self, scope, body_file):
+        request, error_response = super().create_request(scope, body_file)
+        if request is not None:
+            request.urlconf = ASYNC_URLCONF
+        return request, error_response
+
+
+django.setup(set_prefix=False)
+application = CommerceASGIHandler()
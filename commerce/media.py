@@ -0,0 +1,147 @@
+"""
+Production serving of MEDIA_ROOT (listing images and their variants).
+
+serve_media() streams files in blocks through FileResponse. WSGI servers
+that provide wsgi.file_wrapper (gunicorn, uWSGI) hand the open file to
+os.sendfile() instead, ranges included, since FileRange exposes the
+underlying fileno() positioned at the start of the range. Responses carry
+a strong ETag and Last-Modified, answer conditional requests with 304 and
+single byte ranges with 206. With MEDIA_ACCEL_REDIRECT set, the response
+only names the file in an X-Accel-Redirect header and the front proxy
+(an nginx `internal` location) sends it.
+"""
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+DEFAULT_MEDIA_CACHE_MAX_AGE = 60 * 60 * 24 * 7
+BLOCK_SIZE = 64 * 1024
+
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class FileRange:
+    """Read-only view of length bytes of an open file from start on."""
+
+    def __init__(self, f, start: int, length: int):
+        f.seek(start)
+        self.file = f
+        self.remaining = length
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self) -> int:
+        return self.file.fileno()
+
+    def close(self) -> None:
+        self.file.close()
+
+
+def parse_range(header: str, size: int) -> tuple[int, int] | None:
+    """
+    The (start, end) inclusive byte positions of a single-range Range header,
+    None when the header asks for anything else (serve the whole file), and
+    raises ValueError when the range lies outside the file.
+    """
+    match = _RANGE.match(header.replace(" ", ""))
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:  # suffix range, the final `last` bytes
+        length = int(last)
+        if not length:
+            raise ValueError("Empty suffix range.")
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError("Range not satisfiable.")
+    return start, end
+
+
+def _etag(stat: os.stat_result) -> str:
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def _cache_headers(response, stat: os.stat_result | None = None):
+    max_age = getattr(settings, "MEDIA_CACHE_MAX_AGE", DEFAULT_MEDIA_CACHE_MAX_AGE)
+    response["Cache-Control"] = f"public, max-age={max_age}"
+    if stat is not None:
+        response["ETag"] = _etag(stat)
+        response["Last-Modified"] = http_date(stat.st_mtime)
+    return response
+
+
+def _if_range_matches(request, stat: os.stat_result) -> bool:
+    """Whether a Range header applies, given the validator in If-Range if any."""
+    if_range = request.META.get("HTTP_IF_RANGE")
+    if not if_range:
+        return True
+    if if_range.startswith('"'):
+        return if_range == _etag(stat)
+    modified = parse_http_date_safe(if_range)
+    return modified is not None and int(stat.st_mtime) <= modified
+
+
+@require_safe
+def serve_media(request, path):
+    try:
+        fullpath = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404("No such file.")
+    content_type = mimetypes.guess_type(fullpath)[0] or "application/octet-stream"
+
+    accel_prefix = getattr(settings, "MEDIA_ACCEL_REDIRECT", None)
+    if accel_prefix:
+        # The proxy handles ranges, validators and missing files itself.
+        response = HttpResponse(content_type=content_type)
+        response["X-Accel-Redirect"] = accel_prefix.rstrip("/") + "/" + path.lstrip("/")
+        return _cache_headers(response)
+
+    try:
+        stat = os.stat(fullpath)
+    except OSError:
+        raise Http404("No such file.")
+    if not os.path.isfile(fullpath):
+        raise Http404("No such file.")
+
+    response = get_conditional_response(request, etag=_etag(stat), last_modified=int(stat.st_mtime))
+    if response is not None:
+        return _cache_headers(response, stat)
+
+    size = stat.st_size
+    byte_range = None
+    if "HTTP_RANGE" in request.META and _if_range_matches(request, stat):
+        try:
+            byte_range = parse_range(request.META["HTTP_RANGE"], size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            return _cache_headers(response, stat)
+
+    f = open(fullpath, "rb")
+    if byte_range is None:
+        response = FileResponse(f, content_type=content_type)
+    else:
+        start, end = byte_range
+        response = FileResponse(FileRange(f, start, end - start + 1), content_type=content_type, status=206)
+        response["Content-Length"] = end - start + 1
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    response.block_size = BLOCK_SIZE
+    response["Accept-Ranges"] = "bytes"
+    return _cache_headers(response, stat)
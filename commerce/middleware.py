@@ -0,0 +1,177 @@
+import functools
+import json
+import logging
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.template.base import Template
+
+logger = logging.getLogger("commerce.performance")
+
+DEFAULT_SLOW_REQUEST_MS = 500
+REPORTED_STATEMENTS = 3
+
+_metrics: ContextVar["RequestMetrics | None"] = ContextVar("request_metrics", default=None)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.sql_time_in_templates = 0.0
+        self.template_count = 0
+        self.template_time = 0.0
+        self.template_depth = 0
+        # statement -> [executions, total seconds], keyed on the SQL before
+        # parameter substitution so repeated N+1 lookups group together.
+        self.statements = defaultdict(lambda: [0, 0.0])
+
+    def record_query(self, sql: str, duration: float) -> None:
+        self.sql_count += 1
+        self.sql_time += duration
+        if self.template_depth:
+            self.sql_time_in_templates += duration
+        stats = self.statements[sql]
+        stats[0] += 1
+        stats[1] += duration
+
+    def server_timing(self, total: float) -> str:
+        """
+        Format the metrics as a Server-Timing header value (durations in ms).
+
+        tpl excludes SQL triggered lazily from templates, which is counted
+        under sql, and app is whatever remains of the total.
+        """
+        template = self.template_time - self.sql_time_in_templates
+        app = max(total - self.sql_time - template, 0.0)
+        return ", ".join([
+            f'sql;dur={self.sql_time * 1000:.2f};desc="{self.sql_count} queries"',
+            f'tpl;dur={template * 1000:.2f};desc="{self.template_count} templates"',
+            f"app;dur={app * 1000:.2f}",
+            f"total;dur={total * 1000:.2f}",
+        ])
+
+    def report(self, request, response, total: float) -> dict:
+        def top(key):
+            ranked = sorted(self.statements.items(), key=key, reverse=True)[:REPORTED_STATEMENTS]
+            return [
+                {"sql": sql, "count": count, "ms": round(seconds * 1000, 2)}
+                for sql, (count, seconds) in ranked
+            ]
+
+        return {
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "total_ms": round(total * 1000, 2),
+            "sql_count": self.sql_count,
+            "sql_ms": round(self.sql_time * 1000, 2),
+            "template_ms": round(self.template_time * 1000, 2),
+            "slowest_sql": top(lambda item: item[1][1]),
+            "most_repeated_sql": top(lambda item: item[1][0]),
+        }
+
+
+def _wrap_connections(stack: ExitStack) -> None:
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(_record_sql))
+
+
+def _record_sql(execute, sql, params, many, context):
+    metrics = _metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.record_query(sql, time.perf_counter() - started)
+
+
+# Unwrapped, so reloading this module wraps Django's render again rather
+# than the previous wrapper, which reads the old module's _metrics.
+_original_render = getattr(Template.render, "__wrapped__", Template.render)
+
+
+@functools.wraps(_original_render)
+def _instrumented_render(self, context):
+    metrics = _metrics.get()
+    if metrics is None:
+        return _original_render(self, context)
+    metrics.template_depth += 1
+    started = time.perf_counter()
+    try:
+        return _original_render(self, context)
+    finally:
+        metrics.template_depth -= 1
+        metrics.template_count += 1
+        # Included templates (and crispy forms' field templates) render inside
+        # their parent, only time the outermost render.
+        if not metrics.template_depth:
+            metrics.template_time += time.perf_counter() - started
+
+
+# Installed once, when the middleware is imported. Outside a measured
+# request a render only pays for the _metrics lookup.
+Template.render = _instrumented_render
+
+
+class PerformanceMiddleware:
+    """
+    Measure SQL, template and total time of every request.
+
+    The numbers are returned in a Server-Timing header, and requests slower
+    than PERF_SLOW_REQUEST_MS are logged to "commerce.performance" together
+    with their slowest and most repeated SQL statements. Template timing
+    wraps Template.render the same way Django's test runner instruments it.
+    Should be first in MIDDLEWARE so the total covers the whole stack.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_request_ms = getattr(settings, "PERF_SLOW_REQUEST_MS", DEFAULT_SLOW_REQUEST_MS)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _metrics.set(metrics)
+        try:
+            with ExitStack() as stack:
+                _wrap_connections(stack)
+                response = self.get_response(request)
+        finally:
+            _metrics.reset(token)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _metrics.set(metrics)
+        stack = ExitStack()
+        try:
+            # Connections belong to a thread, and queries run in the thread
+            # sync_to_async() hands them to, so wrap (and unwrap) them there.
+            await sync_to_async(_wrap_connections)(stack)
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+            _metrics.reset(token)
+        return self.finish(request, response, metrics)
+
+    def finish(self, request, response, metrics: RequestMetrics):
+        total = time.perf_counter() - metrics.started
+        response["Server-Timing"] = metrics.server_timing(total)
+        if total * 1000 >= self.slow_request_ms:
+            logger.warning("Slow request %s", json.dumps(metrics.report(request, response, total)))
+        return response
@@ -0,0 +1,141 @@
+"""
+Read/write split between the primary ("default") database and read replicas.
+
+ReplicaRouter sends reads made while handling a request to one of the
+DATABASE_REPLICAS aliases and everything else to the primary: writes,
+reads inside a transaction, reads later in a request that already wrote,
+reads outside requests (management commands, the scheduler), which are
+rarely worth a stale answer, and sessions. ReplicaRoutingMiddleware scopes that
+state to the request and, after a write, pins the client to the primary
+for REPLICA_LAG seconds with a cookie so it reads its own writes.
+
+For offline use, snapshot() copies an SQLite primary into an SQLite replica
+with the backup API; `manage.py snapshot_replica` repeats that every
+REPLICA_LAG seconds, which is then the replica's worst-case lag.
+"""
+import math
+import random
+import sqlite3
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE = "read_primary"
+DEFAULT_REPLICA_LAG = 5.0
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class RoutingState:
+    """Per-request routing decision, mutated in place so sync_to_async() threads share it."""
+
+    def __init__(self, pinned: bool = False):
+        self.pinned = pinned
+        self.wrote = False
+
+
+_state: ContextVar[RoutingState | None] = ContextVar("replica_routing", default=None)
+
+
+def replica_lag() -> float:
+    return getattr(settings, "REPLICA_LAG", DEFAULT_REPLICA_LAG)
+
+
+class ReplicaRouter:
+    # A session missing from a lagging replica would log its user out and
+    # clear the cookie, so sessions are always read from the primary.
+    primary_only_apps = {"sessions"}
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        replicas = getattr(settings, "DATABASE_REPLICAS", ())
+        if (
+            state is None
+            or state.pinned
+            or not replicas
+            or model._meta.app_label in self.primary_only_apps
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            # Asking for the write database is as good as a write, the rest
+            # of the request must see it.
+            state.pinned = state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in getattr(settings, "DATABASE_REPLICAS", ())
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Scope ReplicaRouter's state to the request. Unsafe methods and clients
+    holding the pin cookie read from the primary throughout. Should come
+    before SessionMiddleware so the session lookup is routed too.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = self.start(request)
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.finish(response, state)
+
+    async def __acall__(self, request):
+        state = self.start(request)
+        token = _state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.finish(response, state)
+
+    def start(self, request) -> RoutingState:
+        return RoutingState(pinned=request.method not in SAFE_METHODS or PIN_COOKIE in request.COOKIES)
+
+    def finish(self, response, state: RoutingState):
+        if state.wrote:
+            response.set_cookie(
+                PIN_COOKIE, "1", max_age=math.ceil(replica_lag()), httponly=True, samesite="Lax"
+            )
+        return response
+
+
+def snapshot(replica: str, primary: str = DEFAULT_DB_ALIAS, pages: int = -1) -> None:
+    """Copy the SQLite primary database into the SQLite replica alias with the backup API."""
+    names = []
+    for alias in (primary, replica):
+        settings_dict = connections[alias].settings_dict
+        if connections[alias].vendor != "sqlite":
+            raise ImproperlyConfigured(f"Database {alias!r} is not SQLite, it cannot be snapshotted.")
+        names.append(settings_dict["NAME"])
+    # Plain connections of our own, so the copy never runs inside a Django
+    # transaction. The backup is consistent even while the primary is written.
+    source, target = (sqlite3.connect(name, timeout=30) for name in names)
+    try:
+        source.backup(target, pages=pages)
+    finally:
+        source.close()
+        target.close()
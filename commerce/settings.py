@@ -53,6 +53,14 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# Opt-in request instrumentation: Server-Timing headers plus a structured
+# log line for requests slower than PERF_SLOW_REQUEST_MS.
+PERF_INSTRUMENTATION = os.environ.get("DJANGO_PERF_INSTRUMENTATION") == "1"
+PERF_SLOW_REQUEST_MS = int(os.environ.get("DJANGO_PERF_SLOW_REQUEST_MS", 500))
+
+if PERF_INSTRUMENTATION:
+    MIDDLEWARE.insert(0, "commerce.middleware.PerformanceMiddleware")
+
 ROOT_URLCONF = "commerce.urls"
 
 TEMPLATES = [
@@ -84,8 +92,113 @@ DATABASES = {
     }
 }
 
+# Production SQLite profile, enabled with DJANGO_SQLITE_PROFILE=production.
+# WAL lets readers run alongside the single writer, BEGIN IMMEDIATE takes the
+# write lock when an atomic block starts instead of failing to upgrade a
+# read lock halfway through, and busy_timeout (the "timeout" option) makes a
+# blocked writer wait for its turn rather than raise "database is locked".
+# Connections are kept open between requests so the pragmas and page cache
+# are not rebuilt every time. See `manage.py benchmark_sqlite`.
+SQLITE_PRODUCTION_PROFILE = {
+    "CONN_MAX_AGE": 600,
+    "CONN_HEALTH_CHECKS": True,
+    "OPTIONS": {
+        "transaction_mode": "IMMEDIATE",
+        "timeout": 5,
+        "init_command": (
+            "PRAGMA journal_mode=WAL;"
+            "PRAGMA synchronous=NORMAL;"
+            "PRAGMA mmap_size=134217728;"  # 128 MiB
+            "PRAGMA cache_size=-20000;"  # 20 MB
+            "PRAGMA temp_store=MEMORY;"
+        ),
+    },
+}
+
+if os.environ.get("DJANGO_SQLITE_PROFILE") == "production":
+    DATABASES["default"].update(SQLITE_PRODUCTION_PROFILE)
+
+# Read replicas, see commerce.replicas. DJANGO_SQLITE_REPLICA=1 adds a local
+# SQLite stand-in refreshed by `manage.py snapshot_replica` every REPLICA_LAG
+# seconds; a client that wrote reads from the primary for that long after.
+DATABASE_REPLICAS = []
+REPLICA_LAG = float(os.environ.get("DJANGO_REPLICA_LAG", 5))
+
+if os.environ.get("DJANGO_SQLITE_REPLICA") == "1":
+    DATABASES["replica"] = {
+        **DATABASES["default"],
+        "NAME": os.path.join(BASE_DIR, "db.replica.sqlite3"),
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS.append("replica")
+
+if DATABASE_REPLICAS:
+    DATABASE_ROUTERS = ["commerce.replicas.ReplicaRouter"]
+    MIDDLEWARE.insert(
+        MIDDLEWARE.index("django.contrib.sessions.middleware.SessionMiddleware"),
+        "commerce.replicas.ReplicaRoutingMiddleware",
+    )
+
 AUTH_USER_MODEL = "auctions.User"
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Local memory by default; set DJANGO_CACHE_DIR to share a file-based cache
+# between worker processes. Neither needs an external server.
+
+if os.environ.get("DJANGO_CACHE_DIR"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.environ["DJANGO_CACHE_DIR"],
+        },
+        "sessions": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.path.join(os.environ["DJANGO_CACHE_DIR"], "sessions"),
+        },
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "OPTIONS": {"MAX_ENTRIES": 10000},
+        },
+        "sessions": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "sessions",
+            "OPTIONS": {"MAX_ENTRIES": 10000},
+        },
+    }
+
+# Sessions, selected with DJANGO_SESSION_STORE:
+# - "db" (default) reads and writes django_session on every session access.
+# - "cache" writes through to the database but serves reads from the
+#   "sessions" cache. Needs a cache shared by all worker processes
+#   (DJANGO_CACHE_DIR), or one process may keep serving a session another
+#   has logged out.
+# - "cookie" keeps the whole session in a signed cookie and never touches
+#   the server; a logout cannot revoke copies of the cookie.
+SESSION_ENGINE = {
+    "db": "django.contrib.sessions.backends.db",
+    "cache": "django.contrib.sessions.backends.cached_db",
+    "cookie": "django.contrib.sessions.backends.signed_cookies",
+}[os.environ.get("DJANGO_SESSION_STORE", "db")]
+SESSION_CACHE_ALIAS = "sessions"
+
+# Flash messages travel in their own cookie, so adding one never forces a
+# session write and showing them never loads the session.
+MESSAGE_STORAGE = "django.contrib.messages.storage.cookie.CookieStorage"
+
+# Seconds a rendered listing card stays cached; cards are also invalidated
+# whenever Listing.version changes.
+LISTING_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Live bid events for the SSE stream (auctions.events). "local" delivers
+# within one process, "database" shares events between worker processes
+# through the ListingEvent table.
+AUCTION_EVENTS_BACKEND = os.environ.get("AUCTION_EVENTS_BACKEND", "local")
+AUCTION_EVENTS_HEARTBEAT = 15
+
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
 
@@ -123,14 +236,51 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/3.0/howto/static-files/
 
 STATIC_URL = "/static/"
+STATIC_ROOT = os.path.join(BASE_DIR, "staticfiles")
+
+# Uploads are stored once per distinct content, see auctions.storage.
+STORAGES = {
+    "default": {"BACKEND": "auctions.storage.ContentAddressedStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+
+# Production static files, see commerce.staticfiles. With DJANGO_STATIC_PIPELINE=1
+# `collectstatic` writes hashed and precompressed files to STATIC_ROOT, and
+# the app serves them itself with one-year immutable caching.
+if os.environ.get("DJANGO_STATIC_PIPELINE") == "1":
+    STORAGES["staticfiles"] = {"BACKEND": "commerce.staticfiles.CompressedManifestStaticFilesStorage"}
+    MIDDLEWARE.insert(
+        MIDDLEWARE.index("django.middleware.security.SecurityMiddleware") + 1,
+        "commerce.staticfiles.StaticFilesMiddleware",
+    )
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Uploaded images are served by commerce.media in every environment. Set
+# DJANGO_MEDIA_ACCEL_REDIRECT to an nginx `internal` location aliasing
+# MEDIA_ROOT (e.g. /protected-media/) to let the proxy send the bytes.
+MEDIA_CACHE_MAX_AGE = int(os.environ.get("DJANGO_MEDIA_CACHE_MAX_AGE", 60 * 60 * 24 * 7))
+MEDIA_ACCEL_REDIRECT = os.environ.get("DJANGO_MEDIA_ACCEL_REDIRECT")
+
+# Listing image uploads, see auctions.uploads. On the new-listing page, files
+# over the size limit or not starting like an image are dropped while they
+# stream in; accepted ones are re-encoded without metadata to fit
+# LISTING_IMAGE_MAX_DIMENSION.
+LISTING_IMAGE_MAX_UPLOAD_SIZE = 20 * 1024 * 1024
+LISTING_IMAGE_MAX_PIXELS = 40_000_000
+LISTING_IMAGE_MAX_DIMENSION = 2048
+
 CRISPY_TEMPLATE_PACK = "bootstrap4"
 
 LOGIN_URL = '/login/'
 
+# Number of cards per page on the cursor-paginated listing grids
+LISTINGS_PAGE_SIZE = int(os.environ.get("LISTINGS_PAGE_SIZE", 25))
+
+# Comments shown on a listing page, older ones load on demand
+COMMENTS_PAGE_SIZE = int(os.environ.get("COMMENTS_PAGE_SIZE", 20))
+
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
@@ -0,0 +1,165 @@
+"""
+Production static files: content-hashed, precompressed, cached for a year.
+
+CompressedManifestStaticFilesStorage makes `collectstatic` write every file
+to STATIC_ROOT under a content-hashed name (styles.css ->
+styles.5d41402abc4b.css, as ManifestStaticFilesStorage does) and then
+writes gzip and, when the optional brotli package is installed, brotli
+versions of the text assets next to them. StaticFilesMiddleware serves
+STATIC_ROOT in-process for deployments without a front-end server: it
+picks the precompressed file the client accepts, never compresses at
+request time, and marks hashed names immutable for a year.
+"""
+import gzip
+import mimetypes
+import os
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_etags
+from django.views.static import was_modified_since
+
+try:
+    import brotli
+except ImportError:  # optional, gzip alone covers every browser
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = {".css", ".js", ".mjs", ".map", ".svg", ".txt", ".html", ".json", ".xml", ".ico"}
+# Smaller files gain nothing worth a second request-time stat.
+MIN_COMPRESS_SIZE = 256
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+UNHASHED_CACHE_CONTROL = "public, max-age=60"
+
+# (Accept-Encoding token, file suffix), in order of preference
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def _compressors():
+    yield ".gz", lambda data: gzip.compress(data, compresslevel=9, mtime=0)
+    if brotli is not None:
+        yield ".br", lambda data: brotli.compress(data, quality=11)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """ManifestStaticFilesStorage that also writes .gz and .br copies of text assets."""
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        names = {*paths, *self.hashed_files.values()}
+        for name in sorted(names):
+            if os.path.splitext(name)[1].lower() in COMPRESSIBLE_EXTENSIONS and self.exists(name):
+                self.compress(name)
+
+    def compress(self, name: str) -> None:
+        path = self.path(name)
+        with open(path, "rb") as f:
+            data = f.read()
+        if len(data) < MIN_COMPRESS_SIZE:
+            return
+        for suffix, compress in _compressors():
+            compressed = compress(data)
+            if len(compressed) < len(data):
+                with open(path + suffix, "wb") as f:
+                    f.write(compressed)
+
+
+def accepted_encodings(header: str) -> set[str]:
+    """The content codings an Accept-Encoding header allows (q > 0)."""
+    accepted = set()
+    for item in header.split(","):
+        coding, _, params = item.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if coding:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+class StaticFilesMiddleware:
+    """
+    Serve STATIC_URL from STATIC_ROOT before the rest of the stack runs.
+    Should come right after SecurityMiddleware.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefix = settings.STATIC_URL
+        self.root = str(settings.STATIC_ROOT)
+        # Names written by collectstatic under their content hash, from the manifest.
+        self.hashed = set(getattr(staticfiles_storage, "hashed_files", {}).values())
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.static_response(request) or self.get_response(request)
+
+    async def __acall__(self, request):
+        # A couple of stat() calls, not worth a thread hop.
+        return self.static_response(request) or await self.get_response(request)
+
+    def static_response(self, request):
+        if request.method in ("GET", "HEAD") and request.path_info.startswith(self.prefix):
+            return self.serve(request, request.path_info[len(self.prefix):])
+        return None
+
+    def serve(self, request, name: str):
+        try:
+            path = safe_join(self.root, name)
+        except SuspiciousFileOperation:
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if not os.path.isfile(path):
+            return None
+
+        # Weak, as the gzip, brotli and identity encodings share it.
+        etag = f'W/"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        if_none_match = request.META.get("HTTP_IF_NONE_MATCH")
+        if if_none_match is not None:
+            # If-None-Match compares weakly, and takes precedence over the date.
+            tags = {tag.removeprefix("W/") for tag in parse_etags(if_none_match)}
+            not_modified = "*" in tags or etag.removeprefix("W/") in tags
+        else:
+            not_modified = not was_modified_since(request.META.get("HTTP_IF_MODIFIED_SINCE"), stat.st_mtime)
+
+        if not_modified:
+            response = HttpResponseNotModified()
+        else:
+            encoding, served = None, path
+            accepted = accepted_encodings(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+            for coding, suffix in ENCODINGS:
+                if coding in accepted and os.path.isfile(path + suffix):
+                    encoding, served = coding, path + suffix
+                    break
+            content_type, _ = mimetypes.guess_type(name)
+            response = FileResponse(open(served, "rb"), content_type=content_type or "application/octet-stream")
+            # FileResponse names the file it read, which may be the .gz/.br copy.
+            del response["Content-Disposition"]
+            if encoding:
+                response["Content-Encoding"] = encoding
+            response["Last-Modified"] = http_date(stat.st_mtime)
+
+        response["ETag"] = etag
+        if os.path.splitext(name)[1].lower() in COMPRESSIBLE_EXTENSIONS:
+            response["Vary"] = "Accept-Encoding"
+        response["Cache-Control"] = IMMUTABLE_CACHE_CONTROL if name in self.hashed else UNHASHED_CACHE_CONTROL
+        return response
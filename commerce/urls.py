@@ -17,10 +17,11 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import include, path
 from django.conf import settings
-from django.conf.urls.static import static
 
-urlpatterns = [path("admin/", admin.site.urls), path("", include("auctions.urls"))]
+from .media import serve_media
 
-
-if settings.DEBUG:  # only serve media files in development
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+urlpatterns = [
+    path("admin/", admin.site.urls),
+    path(settings.MEDIA_URL.lstrip("/") + "<path:path>", serve_media, name="media"),
+    path("", include("auctions.urls")),
+]
@@ -0,0 +1,11 @@
+"""
+URL configuration used for requests served through commerce.asgi.
+
+Same as commerce.urls, except that the read views with async versions in
+auctions.async_urls resolve to those first.
+"""
+from django.urls import include, path
+
+from . import urls
+
+urlpatterns = [path("", include("auctions.async_urls")), *urls.urlpatterns]